@@ -6,7 +6,7 @@ from run.run import RunHelper
 
 
 class ButtonHelper:
-    def __init__(self, config):
+    def __init__(self, config, run=None):
         self.view_button_pin = config['view_button_pin']
         self.previous_button_pin = config['previous_button_pin']
         self.next_button_pin = config['next_button_pin']
@@ -14,7 +14,8 @@ class ButtonHelper:
         self.displayTZ = config['displayTZ']
         self.defaultView = config['defaultView']
 
-        self.run = RunHelper(config)
+        # share the RunHelper of the main loop if given, so both use the same warm render worker
+        self.run = run if run is not None else RunHelper(config)
 
         # Set the GPIO mode to BCM
         GPIO.setmode(GPIO.BCM)
@@ -37,40 +38,27 @@ class ButtonHelper:
 
     def view_button_callback(self):
         print("View button pressed!")
-        # Toggle between "week" and "month" view
-        if self.current_view == "week":
-            self.current_view = "2week"
-        elif self.current_view == "2week":
-            self.current_view = "month"
-        elif self.current_view == "month":
-            self.current_view = "week"
+        # Cycle between "week", "2week" and "month" view
+        self.current_view = self.run.get_next_view(self.current_view)
 
-        # Call maginkcal to update the display with the new view
-        self.run.maginkcal(self.current_date, self.current_view, "default")
+        # Call maginkcal to update the display with the new view, prerendered pages are used if available
+        self.run.maginkcal(self.current_date, self.current_view, "default", cached=True)
 
     def previous_button_callback(self):
         print("Previous button pressed!")
         # Navigate to the previous week/month based on the current view
-        if self.current_view == "week":
-            self.current_date -= dt.timedelta(days=7)
-        else:
-            # Assuming each month has 30 days for simplicity, you can modify this part as needed.
-            self.current_date -= dt.timedelta(days=30)
+        self.current_date = self.run.get_adjacent_date(self.current_date, self.current_view, -1)
 
-        # Call maginkcal to update the display with the new date
-        self.run.maginkcal(self.current_date, self.current_view, "default")
+        # Call maginkcal to update the display with the new date, prerendered pages are used if available
+        self.run.maginkcal(self.current_date, self.current_view, "default", cached=True)
 
     def next_button_callback(self):
         print("Next button pressed!")
         # Navigate to the next week/month based on the current view
-        if self.current_view == "week":
-            self.current_date += dt.timedelta(days=7)
-        else:
-            # Assuming each month has 30 days for simplicity, you can modify this part as needed.
-            self.current_date += dt.timedelta(days=30)
+        self.current_date = self.run.get_adjacent_date(self.current_date, self.current_view, 1)
 
-        # Call maginkcal to update the display with the new date
-        self.run.maginkcal(self.current_date, self.current_view, "default")
+        # Call maginkcal to update the display with the new date, prerendered pages are used if available
+        self.run.maginkcal(self.current_date, self.current_view, "default", cached=True)
 
     def home_button_callback(self):
         print("Home (Refresh) button pressed!")
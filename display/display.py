@@ -5,29 +5,69 @@ This part of the code exposes functions to interface with the eink display
 """
 
 import display.epd12in48b as eink
-from PIL import Image
 import logging
 
 
 class DisplayHelper:
 
-    def __init__(self, width, height):
-        # Initialise the display
+    def __init__(self, width, height, pipelined=False, backend=None):
+        # Initialise the display, backend defaults to the GPIO/SPI interface (see display.epdmock for a stand-in)
         self.logger = logging.getLogger('maginkcal')
         self.screenwidth = width
         self.screenheight = height
-        self.epd = eink.EPD()
+        self.pipelined = pipelined
+        self.epd = eink.EPD(backend)
         self.epd.Init()
 
     def update(self, blackimg, redimg):
         # Updates the display with the grayscale and red images
         # start displaying on eink display
         # self.epd.clear()
-        self.epd.display(blackimg, redimg)
+        self.epd.display(blackimg, redimg, self.pipelined)
+        self.log_timings()
         self.logger.info('E-Ink display update complete.')
 
+    def update_buffers(self, blackbuf, redbuf):
+        # Same as update, for frames that were already packed (see display.epd12in48b.pack_image)
+        self.epd.display_buffers(blackbuf, redbuf, self.pipelined)
+        self.epd.TurnOnDisplay(self.pipelined)
+        self.log_timings()
+        self.logger.info('E-Ink display update complete.')
+
+    def update_frame(self, frame):
+        # Same as update_buffers, for a quadrant ordered frame as served by run/frameserver.py
+        from display.framecodec import split_frame
+        self.epd.display_quadrants(split_frame(frame))
+        self.epd.TurnOnDisplay(self.pipelined)
+        self.log_timings()
+        self.logger.info('E-Ink display update complete.')
+
+    def update_from_server(self, client):
+        # Client mode: download the current frame with a display.frameclient.FrameClient and push it to the panel
+        # if it changed since the last call. Neither the render modules nor numpy or Pillow are imported on this path
+        frame = client.fetch()
+        if frame is None:
+            self.logger.info('Frame version {} unchanged, nothing to display'.format(client.version))
+            return False
+        self.logger.info('Frame version {} received ({} bytes on the wire)'.format(client.version, client.received))
+        self.update_frame(frame)
+        return True
+
+    def log_timings(self):
+        # Report where the refresh time went, per quadrant and per controller busy-wait
+        for name, phases in self.epd.timings.items():
+            self.logger.info('E-Ink {} timings: {}'.format(
+                name, ', '.join('{} {:.3f}s'.format(phase, secs) for phase, secs in phases.items())))
+
+    def get_timings(self):
+        # SPI upload and busy-wait of the last refresh in seconds, for the profiler of RunHelper
+        spi = sum(phases.get('send', 0.0) for name, phases in self.epd.timings.items() if name != 'busy')
+        busy = max(self.epd.timings.get('busy', {}).values(), default=0.0)
+        return {'spi': spi, 'busy': busy}
+
     def calibrate(self, cycles=1):
         # Calibrates the display to prevent ghosting
+        from PIL import Image
         white = Image.new('1', (self.screenwidth, self.screenheight), 'white')
         black = Image.new('1', (self.screenwidth, self.screenheight), 'black')
         for _ in range(cycles):
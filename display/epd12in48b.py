@@ -27,40 +27,65 @@
 # THE SOFTWARE.
 #
 import time
-import display.epdconfig as epdconfig
+from concurrent.futures import ThreadPoolExecutor
 
 EPD_WIDTH       = 1304
 EPD_HEIGHT      = 984
 
+# The panel is driven by four controllers, each owning one quadrant of the framebuffer
+# (name, first row, last row + 1, first byte column, last byte column + 1)
+QUADRANTS = [
+    ('S2', 0, 492, 0, 81),      # 648*492
+    ('M2', 0, 492, 81, 163),    # 656*492
+    ('M1', 492, 984, 0, 81),    # 648*492
+    ('S1', 492, 984, 81, 163),  # 656*492
+]
+
+def pack_image(image):
+    # Pack a panel sized PIL image into rows of bytes, MSB first, 1 = white
+    # convert('1') dithers exactly like the per-pixel path in EPD.getbuffer_loop, afterwards every pixel is either
+    # 0 or 255 and numpy exposes it as a boolean array, i.e. already thresholded at 127
+    import numpy as np
+    pixels = np.asarray(image.convert('1'), dtype=bool)
+    return np.packbits(pixels, axis=1)
+
 class EPD(object):
-    def __init__(self):
+    def __init__(self, backend=None):
+        # backend defaults to the GPIO/SPI interface in epdconfig, display.epdmock can be passed instead to run
+        # without the hardware attached
+        if backend is None:
+            import display.epdconfig as backend
+        self.epdconfig = backend
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
-        self.EPD_M1_CS_PIN  = epdconfig.EPD_M1_CS_PIN
-        self.EPD_S1_CS_PIN  = epdconfig.EPD_S1_CS_PIN
-        self.EPD_M2_CS_PIN  = epdconfig.EPD_M2_CS_PIN
-        self.EPD_S2_CS_PIN  = epdconfig.EPD_S2_CS_PIN
+        self.EPD_M1_CS_PIN  = self.epdconfig.EPD_M1_CS_PIN
+        self.EPD_S1_CS_PIN  = self.epdconfig.EPD_S1_CS_PIN
+        self.EPD_M2_CS_PIN  = self.epdconfig.EPD_M2_CS_PIN
+        self.EPD_S2_CS_PIN  = self.epdconfig.EPD_S2_CS_PIN
+
+        self.EPD_M1S1_DC_PIN  = self.epdconfig.EPD_M1S1_DC_PIN
+        self.EPD_M2S2_DC_PIN  = self.epdconfig.EPD_M2S2_DC_PIN
 
-        self.EPD_M1S1_DC_PIN  = epdconfig.EPD_M1S1_DC_PIN
-        self.EPD_M2S2_DC_PIN  = epdconfig.EPD_M2S2_DC_PIN
+        self.EPD_M1S1_RST_PIN = self.epdconfig.EPD_M1S1_RST_PIN
+        self.EPD_M2S2_RST_PIN = self.epdconfig.EPD_M2S2_RST_PIN
 
-        self.EPD_M1S1_RST_PIN = epdconfig.EPD_M1S1_RST_PIN
-        self.EPD_M2S2_RST_PIN = epdconfig.EPD_M2S2_RST_PIN
+        self.EPD_M1_BUSY_PIN  = self.epdconfig.EPD_M1_BUSY_PIN
+        self.EPD_S1_BUSY_PIN  = self.epdconfig.EPD_S1_BUSY_PIN
+        self.EPD_M2_BUSY_PIN  = self.epdconfig.EPD_M2_BUSY_PIN
+        self.EPD_S2_BUSY_PIN  = self.epdconfig.EPD_S2_BUSY_PIN
 
-        self.EPD_M1_BUSY_PIN  = epdconfig.EPD_M1_BUSY_PIN
-        self.EPD_S1_BUSY_PIN  = epdconfig.EPD_S1_BUSY_PIN
-        self.EPD_M2_BUSY_PIN  = epdconfig.EPD_M2_BUSY_PIN
-        self.EPD_S2_BUSY_PIN  = epdconfig.EPD_S2_BUSY_PIN
+        # seconds spent per phase of the last refresh, e.g. {'S2': {'prepare': .., 'send': ..}, 'busy': {..}}
+        self.timings = {}
 
     def Init(self):
         print("EPD init...")
-        epdconfig.module_init()
+        self.epdconfig.module_init()
         
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1) 
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 1) 
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1) 
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 1) 
         self.Reset() 
 
         # panel setting for Clear
@@ -132,139 +157,130 @@ class EPD(object):
 
         self.M1_ReadTemperature()
         
-    def display(self, BlackImage, RedImage):
-        start = time.perf_counter()
-        
-        Blackbuf = [0x00] * int(self.width * self.height / 8)
-        blackconvert = BlackImage.convert('1')       
-        bimwidth, bimheight = blackconvert.size 
-        Blackpixles = blackconvert.load()
-        temp=0
-        for y in range(0, bimheight):
-            for x in range(0, bimwidth):
-                if Blackpixles[x, y] < 127:           # black
-                    Blackbuf[int((x + y*self.width)/8)] &= ~(0x80>>temp)
-                else:                           # white
-                    Blackbuf[int((x + y*self.width)/8)] |= (0x80>>temp)
-                temp=temp+1
-                if(temp==8):
-                    temp=0
-                    
-        Redbuf = [0x00] * int(self.width * self.height / 8)
-        redconvert = RedImage.convert('1')
-        rimwidth, rimheight = redconvert.size 
-        Redpixles = redconvert.load()
+    def getbuffer(self, image):
+        # Pack a PIL image into the 1bpp framebuffer layout of the panel (MSB first, 1 = white)
+        imwidth, imheight = image.size
+        if imwidth != self.width or imheight != self.height:
+            return self.getbuffer_loop(image)
+        return bytearray(pack_image(image).tobytes())
+
+    def getbuffer_loop(self, image):
+        # Reference implementation, also used for images that do not match the panel size
+        buf = [0x00] * int(self.width * self.height / 8)
+        imageconvert = image.convert('1')
+        imwidth, imheight = imageconvert.size
+        pixels = imageconvert.load()
         temp=0
-        for y in range(0, rimheight):
-            for x in range(0, rimwidth):
-                if Redpixles[x, y] < 127:           # black
-                    Redbuf[int((x + y*self.width)/8)] &= ~(0x80>>temp)
+        for y in range(0, imheight):
+            for x in range(0, imwidth):
+                if pixels[x, y] < 127:           # black
+                    buf[int((x + y*self.width)/8)] &= ~(0x80>>temp)
                 else:                           # white
-                    Redbuf[int((x + y*self.width)/8)] |= (0x80>>temp)
+                    buf[int((x + y*self.width)/8)] |= (0x80>>temp)
                 temp=temp+1
                 if(temp==8):
                     temp=0
-                    
-        #S2 part 648*492
-        self.S2_SendCommand(0x10)
-        for y in  range(0, 492):
-            for x in  range(0, 81):
-                self.S2_SendData(Blackbuf[y*163 + x])
-        self.S2_SendCommand(0x13)
-        for y in  range(0, 492):
-            for x in  range(0, 81):
-                self.S2_SendData(~Redbuf[y*163 + x])
-                
-        #M2 part 656*492
-        self.M2_SendCommand(0x10)
-        for y in  range(0, 492):
-            for x in  range(81, 163):
-                self.M2_SendData(Blackbuf[y*163 + x])
-        self.M2_SendCommand(0x13)
-        for y in  range(0, 492):
-            for x in  range(81, 163):
-                self.M2_SendData(~Redbuf[y*163 + x])
-
-        #M1 part 648*492    
-        self.M1_SendCommand(0x10)
-        for y in  range(492, 984):
-            for x in  range(0, 81):
-                self.M1_SendData(Blackbuf[y*163 + x])
-        self.M1_SendCommand(0x13)
-        for y in  range(492, 984):
-            for x in  range(0, 81):
-                self.M1_SendData(~Redbuf[y*163 + x])
-        
-        #S1 part 656*492
-        self.S1_SendCommand(0x10)
-        for y in  range(492, 984):
-            for x in  range(81, 163):
-                self.S1_SendData(Blackbuf[y*163 + x])
-        self.S1_SendCommand(0x13)
-        for y in  range(492, 984):
-            for x in  range(81, 163):
-                self.S1_SendData(~Redbuf[y*163 + x])
-                
+        return buf
+
+    def getplane(self, buf):
+        # View a packed framebuffer (bytes, bytearray or list of ints) as rows of bytes. numpy is imported here, so
+        # clients that receive ready quadrants (see display/framecodec.py) do without it
+        import numpy as np
+        return np.frombuffer(bytes(buf), dtype=np.uint8).reshape(self.height, self.width // 8)
+
+    def getquadrant(self, plane, quadrant):
+        # Cut one controller's slice out of a plane as a contiguous block of bytes
+        name, y0, y1, x0, x1 = quadrant
+        return plane[y0:y1, x0:x1].tobytes()
+
+    def display(self, BlackImage, RedImage, pipelined=False):
+        start = time.perf_counter()
+
+        Blackbuf = self.getbuffer(BlackImage)
+        Redbuf = self.getbuffer(RedImage)
+        self.display_buffers(Blackbuf, Redbuf, pipelined)
+
         end = time.perf_counter()
         print("use time: %f"%(end - start))
-        self.TurnOnDisplay()
+        self.TurnOnDisplay(pipelined)
+
+    def display_buffers(self, Blackbuf, Redbuf, pipelined=False):
+        # Send already packed framebuffers to the four controllers, one block transfer per quadrant and plane
+        self.timings = {}
+        if pipelined:
+            return self.display_buffers_pipelined(Blackbuf, Redbuf)
+        black = self.getplane(Blackbuf)
+        red = ~self.getplane(Redbuf)
+        for quadrant in QUADRANTS:
+            start = time.perf_counter()
+            self.SendQuadrant(quadrant[0], self.getquadrant(black, quadrant), self.getquadrant(red, quadrant))
+            self.timings[quadrant[0]] = {'send': time.perf_counter() - start}
+
+    def display_quadrants(self, quadrants):
+        # Send (controller, black data, red data) slices that are already cut and inverted, e.g. a frame received
+        # from the frame server, see display/framecodec.py
+        self.timings = {}
+        for name, blackdata, reddata in quadrants:
+            start = time.perf_counter()
+            self.SendQuadrant(name, bytes(blackdata), bytes(reddata))
+            self.timings[name] = {'send': time.perf_counter() - start}
+
+    def prepare_quadrant(self, black, red, quadrant):
+        # Cut the black slice and the inverted red slice of one controller, runs on the worker thread
+        start = time.perf_counter()
+        name, y0, y1, x0, x1 = quadrant
+        blackdata = black[y0:y1, x0:x1].tobytes()
+        reddata = (~red[y0:y1, x0:x1]).tobytes()
+        return blackdata, reddata, time.perf_counter() - start
+
+    def display_buffers_pipelined(self, Blackbuf, Redbuf):
+        # While one quadrant is clocked out, the worker already cuts the slices for the next one. numpy copies and
+        # the ctypes SPI calls both release the GIL, so the two actually overlap.
+        black = self.getplane(Blackbuf)
+        red = self.getplane(Redbuf)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(self.prepare_quadrant, black, red, QUADRANTS[0])
+            for i, quadrant in enumerate(QUADRANTS):
+                start = time.perf_counter()
+                blackdata, reddata, prepare = pending.result()
+                wait = time.perf_counter() - start
+                if i + 1 < len(QUADRANTS):
+                    pending = executor.submit(self.prepare_quadrant, black, red, QUADRANTS[i + 1])
+                start = time.perf_counter()
+                self.SendQuadrant(quadrant[0], blackdata, reddata)
+                self.timings[quadrant[0]] = {'prepare': prepare, 'wait': wait, 'send': time.perf_counter() - start}
+
+    def SendQuadrant(self, name, blackdata, reddata):
+        sendCommand = getattr(self, name + '_SendCommand')
+        sendDataBlock = getattr(self, name + '_SendDataBlock')
+        sendCommand(0x10)
+        sendDataBlock(blackdata)
+        sendCommand(0x13)
+        sendDataBlock(reddata)
 
     def clear(self):
         """Clear contents of image buffer"""
         start = time.perf_counter()
-        
-        self.S2_SendCommand(0x10)
-        for y in  range(0, 492):
-            for x in  range(0, 81):
-                self.S2_SendData(0xff)        
-        self.S2_SendCommand(0x13)
-        for y in  range(0, 492):
-            for x in  range(0, 81):
-                self.S2_SendData(0x00)
-                
-        self.M2_SendCommand(0x10)
-        for y in  range(0, 492):
-            for x in  range(81, 163):
-                self.M2_SendData(0xff)
-        self.M2_SendCommand(0x13)
-        for y in  range(0, 492):
-            for x in  range(81, 163):
-                self.M2_SendData(0x00)       
-                    
-        self.M1_SendCommand(0x10)
-        for y in  range(492, 984):
-            for x in  range(0, 81):
-                self.M1_SendData(0xff)
-        self.M1_SendCommand(0x13)
-        for y in  range(492, 984):
-            for x in  range(0, 81):
-                self.M1_SendData(0x00)
-                
-        self.S1_SendCommand(0x10)
-        for y in  range(492, 984):
-            for x in  range(81, 163):
-                self.S1_SendData(0xff)
-        self.S1_SendCommand(0x13)
-        for y in  range(492, 984):
-            for x in  range(81, 163):
-                self.S1_SendData(0x00)
-                
+
+        for quadrant in QUADRANTS:
+            name, y0, y1, x0, x1 = quadrant
+            size = (y1 - y0) * (x1 - x0)
+            self.SendQuadrant(name, b'\xff' * size, b'\x00' * size)
+
         end = time.perf_counter()
-        print (end)
-        print (start)
         print("use time: %f" %(end - start))
         
         self.TurnOnDisplay()
         
     def Reset(self):
-        epdconfig.digital_write(self.EPD_M1S1_RST_PIN, 1) 
-        epdconfig.digital_write(self.EPD_M2S2_RST_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_M1S1_RST_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_M2S2_RST_PIN, 1) 
         time.sleep(0.2) 
-        epdconfig.digital_write(self.EPD_M1S1_RST_PIN, 0) 
-        epdconfig.digital_write(self.EPD_M2S2_RST_PIN, 0) 
+        self.epdconfig.digital_write(self.EPD_M1S1_RST_PIN, 0) 
+        self.epdconfig.digital_write(self.EPD_M2S2_RST_PIN, 0) 
         time.sleep(0.01) 
-        epdconfig.digital_write(self.EPD_M1S1_RST_PIN, 1) 
-        epdconfig.digital_write(self.EPD_M2S2_RST_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_M1S1_RST_PIN, 1) 
+        self.epdconfig.digital_write(self.EPD_M2S2_RST_PIN, 1) 
         time.sleep(0.2) 
     
     def EPD_Sleep(self):
@@ -275,152 +291,200 @@ class EPD(object):
         self.M1S1M2S2_SendData(0xA5) 
         time.sleep(0.3) 
         print("module_exit")
-        epdconfig.module_exit()
+        self.epdconfig.module_exit()
 
-    def TurnOnDisplay(self):
+    def TurnOnDisplay(self, overlapped=False):
         self.M1M2_SendCommand(0x04)  
         time.sleep(0.3) 
         self.M1S1M2S2_SendCommand(0x12) 
-        self.M1_ReadBusy()
-        self.S1_ReadBusy()
-        self.M2_ReadBusy()
-        self.S2_ReadBusy()   
+        if overlapped:
+            self.ReadBusyAll()
+            return
+        # one controller after the other, each one's time is counted from the refresh command like in ReadBusyAll,
+        # including the settle time of the controllers waited for before it
+        start = time.perf_counter()
+        busy = {}
+        for name, readBusy in (('M1', self.M1_ReadBusy), ('S1', self.S1_ReadBusy), ('M2', self.M2_ReadBusy),
+                               ('S2', self.S2_ReadBusy)):
+            readBusy()
+            busy[name] = time.perf_counter() - start
+        self.timings['busy'] = busy
         
     """   M1S1M2S2 Write register address and data     """
     def M1S1M2S2_SendCommand(self, cmd):
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
         
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
-        epdconfig.spi_writebyte(cmd) 
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(cmd) 
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
     
     def M1S1M2S2_SendData(self, val):
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
-
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
-        epdconfig.spi_writebyte(val) 
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
+
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(val) 
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
 
     """   M1M2 Write register address and data     """
     def M1M2_SendCommand(self, cmd):
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
-        epdconfig.spi_writebyte(cmd) 
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(cmd) 
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
         
     def M1M2_Sendata(self, val): 
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
-        epdconfig.spi_writebyte(val) 
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)   
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(val) 
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)   
           
     """   S2 Write register address and data     """
     def S2_SendCommand(self, cmd):
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
-        epdconfig.spi_writebyte(cmd)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(cmd)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
     def S2_SendData(self, val):
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
-        epdconfig.spi_writebyte(val)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(val)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
+    def S2_SendDataBlock(self, buf):
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 0)
+        self.epdconfig.spi_writebytes(buf)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
         
     """   M2 Write register address and data     """
     def M2_SendCommand(self, cmd):
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
-        epdconfig.spi_writebyte(cmd) 
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(cmd) 
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
     def M2_SendData(self, val):
-        epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
-        epdconfig.spi_writebyte(val) 
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(val) 
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
+    def M2_SendDataBlock(self, buf):
+        self.epdconfig.digital_write(self.EPD_M2S2_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 0)
+        self.epdconfig.spi_writebytes(buf)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
 
     """   S1 Write register address and data     """
     def S1_SendCommand(self, cmd):
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
-        epdconfig.spi_writebyte(cmd)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(cmd)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
     def S1_SendData(self, val):
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
-        epdconfig.spi_writebyte(val)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(val)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
+    def S1_SendDataBlock(self, buf):
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 0)
+        self.epdconfig.spi_writebytes(buf)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
         
     """   M1 Write register address and data     """
     def M1_SendCommand(self, cmd):
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
-        epdconfig.spi_writebyte(cmd)
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(cmd)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
     def M1_SendData(self, val):
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
-        epdconfig.spi_writebyte(val)
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.spi_writebyte(val)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+    def M1_SendDataBlock(self, buf):
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.spi_writebytes(buf)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
 
     #Busy
     def M1_ReadBusy(self):
         self.M1_SendCommand(0x71) 
-        busy = epdconfig.digital_read(self.EPD_M1_BUSY_PIN) 
+        busy = self.epdconfig.digital_read(self.EPD_M1_BUSY_PIN) 
         busy = not(busy & 0x01) 
         while(busy):
             self.M1_SendCommand(0x71) 
-            busy = epdconfig.digital_read(self.EPD_M1_BUSY_PIN) 
+            busy = self.epdconfig.digital_read(self.EPD_M1_BUSY_PIN) 
             busy = not(busy & 0x01) 
         time.sleep(0.2)
     def M2_ReadBusy(self):
         self.M2_SendCommand(0x71) 
-        busy = epdconfig.digital_read(self.EPD_M2_BUSY_PIN) 
+        busy = self.epdconfig.digital_read(self.EPD_M2_BUSY_PIN) 
         busy = not(busy & 0x01) 
         self.M2_SendCommand(0x71) 
         while(busy):
             self.M2_SendCommand(0x71) 
-            busy = epdconfig.digital_read(self.EPD_M2_BUSY_PIN) 
+            busy = self.epdconfig.digital_read(self.EPD_M2_BUSY_PIN) 
             busy =not(busy & 0x01) 
         time.sleep(0.2)
     def S1_ReadBusy(self):
         self.S1_SendCommand(0x71) 
-        busy = epdconfig.digital_read(self.EPD_S1_BUSY_PIN) 
+        busy = self.epdconfig.digital_read(self.EPD_S1_BUSY_PIN) 
         busy = not(busy & 0x01) 
         while(busy):
             self.S1_SendCommand(0x71) 
-            busy = epdconfig.digital_read(self.EPD_S1_BUSY_PIN) 
+            busy = self.epdconfig.digital_read(self.EPD_S1_BUSY_PIN) 
             busy = not(busy & 0x01) 
         time.sleep(0.2)        
     def S2_ReadBusy(self):
         self.S2_SendCommand(0x71) 
-        busy = epdconfig.digital_read(self.EPD_S2_BUSY_PIN) 
+        busy = self.epdconfig.digital_read(self.EPD_S2_BUSY_PIN) 
         busy = not(busy & 0x01) 
         while(busy):
             self.S2_SendCommand(0x71) 
-            busy = epdconfig.digital_read(self.EPD_S2_BUSY_PIN) 
+            busy = self.epdconfig.digital_read(self.EPD_S2_BUSY_PIN) 
             busy = not(busy & 0x01) 
         time.sleep(0.2)            
 
+    def ReadBusyAll(self):
+        # Poll the four busy pins in one loop instead of one controller after the other and record how long each
+        # controller stayed busy
+        start = time.perf_counter()
+        pending = {
+            'M1': (self.M1_SendCommand, self.EPD_M1_BUSY_PIN),
+            'S1': (self.S1_SendCommand, self.EPD_S1_BUSY_PIN),
+            'M2': (self.M2_SendCommand, self.EPD_M2_BUSY_PIN),
+            'S2': (self.S2_SendCommand, self.EPD_S2_BUSY_PIN),
+        }
+        busy = {}
+        while pending:
+            for name, (sendCommand, pin) in list(pending.items()):
+                sendCommand(0x71)
+                if self.epdconfig.digital_read(pin) & 0x01:
+                    busy[name] = time.perf_counter() - start
+                    del pending[name]
+        self.timings['busy'] = busy
+        time.sleep(0.2)
+
     lut_vcom1 = [
         0x00,	0x10,	0x10,	0x01,	0x08,	0x01,
         0x00,	0x06,	0x01,	0x06,	0x01,	0x05,
@@ -512,16 +576,16 @@ class EPD(object):
         self.M1_ReadBusy()
         time.sleep(0.3)
         
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
-        epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
-        epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 0)
+        self.epdconfig.digital_write(self.EPD_S1_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M2_CS_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_S2_CS_PIN, 1)
         
-        epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
+        self.epdconfig.digital_write(self.EPD_M1S1_DC_PIN, 1)
         time.sleep(0.05)
         
-        temp = epdconfig.spi_readbyte(0x00)
-        epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
+        temp = self.epdconfig.spi_readbyte(0x00)
+        self.epdconfig.digital_write(self.EPD_M1_CS_PIN, 1)
         
         self.M1S1M2S2_SendCommand(0xE0)
         self.M1S1M2S2_SendData(0x03)
@@ -81,6 +81,17 @@ def digital_read(pin):
 
 def spi_writebyte(value): 
     spi.DEV_SPI_WriteByte(value)
+
+def spi_writebytes(buffer):
+    # Block transfer, the caller keeps CS low (and DC set) for the whole buffer
+    data = bytes(buffer)
+    if hasattr(spi, 'DEV_SPI_Write_nByte'):
+        spi.DEV_SPI_Write_nByte(data, len(data))
+    else:
+        # older DEV_Config builds only export the single byte write
+        writebyte = spi.DEV_SPI_WriteByte
+        for value in data:
+            writebyte(value)
  
 def delay_ms(delaytime):
     time.sleep(delaytime / 1000.0)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stand-in for display/epdconfig.py that records the SPI traffic instead of driving the GPIO pins of the 12.48" HAT.
+Pass it to the driver as EPD(backend=MockEPDConfig()) to exercise or time the display code on any machine. Running this
+file directly benchmarks a full refresh against the mock.
+"""
+
+import time
+
+EPD_SCK_PIN   =11
+EPD_MOSI_PIN  =10
+
+EPD_M1_CS_PIN  =8
+EPD_S1_CS_PIN  =7
+EPD_M2_CS_PIN  =17
+EPD_S2_CS_PIN  =18
+
+EPD_M1S1_DC_PIN  =13
+EPD_M2S2_DC_PIN  =22
+
+EPD_M1S1_RST_PIN =6
+EPD_M2S2_RST_PIN =23
+
+EPD_M1_BUSY_PIN  =5
+EPD_S1_BUSY_PIN  =19
+EPD_M2_BUSY_PIN  =27
+EPD_S2_BUSY_PIN  =24
+
+# controller name -> (CS pin, DC pin)
+CONTROLLERS = {
+    'M1': (EPD_M1_CS_PIN, EPD_M1S1_DC_PIN),
+    'S1': (EPD_S1_CS_PIN, EPD_M1S1_DC_PIN),
+    'M2': (EPD_M2_CS_PIN, EPD_M2S2_DC_PIN),
+    'S2': (EPD_S2_CS_PIN, EPD_M2S2_DC_PIN),
+}
+
+
+class MockEPDConfig:
+
+    # expose the pin numbers the same way the epdconfig module does
+    EPD_SCK_PIN = EPD_SCK_PIN
+    EPD_MOSI_PIN = EPD_MOSI_PIN
+    EPD_M1_CS_PIN = EPD_M1_CS_PIN
+    EPD_S1_CS_PIN = EPD_S1_CS_PIN
+    EPD_M2_CS_PIN = EPD_M2_CS_PIN
+    EPD_S2_CS_PIN = EPD_S2_CS_PIN
+    EPD_M1S1_DC_PIN = EPD_M1S1_DC_PIN
+    EPD_M2S2_DC_PIN = EPD_M2S2_DC_PIN
+    EPD_M1S1_RST_PIN = EPD_M1S1_RST_PIN
+    EPD_M2S2_RST_PIN = EPD_M2S2_RST_PIN
+    EPD_M1_BUSY_PIN = EPD_M1_BUSY_PIN
+    EPD_S1_BUSY_PIN = EPD_S1_BUSY_PIN
+    EPD_M2_BUSY_PIN = EPD_M2_BUSY_PIN
+    EPD_S2_BUSY_PIN = EPD_S2_BUSY_PIN
+
+    def __init__(self, temperature=0x19):
+        self.temperature = temperature
+        self.pins = {}
+        self.busy = {}  # busy pin -> number of reads that still report busy
+        self.transactions = []  # [controllers, dc, bytearray, open] for every CS low period, open until CS goes high
+        self.writeCalls = 0
+        self.gpioCalls = 0
+
+    def selected(self):
+        return tuple(name for name, (cs, dc) in CONTROLLERS.items() if self.pins.get(cs, 1) == 0)
+
+    def record(self, data):
+        controllers = self.selected()
+        if not controllers:
+            return
+        dc = self.pins.get(CONTROLLERS[controllers[0]][1], 1)
+        last = self.transactions[-1] if self.transactions else None
+        if last is not None and last[0] == controllers and last[1] == dc and last[3]:
+            last[2] += data
+        else:
+            self.transactions.append([controllers, dc, bytearray(data), True])
+
+    def digital_write(self, pin, value):
+        self.gpioCalls += 1
+        if value and self.pins.get(pin) == 0 and self.transactions:
+            # CS going high closes the running transaction
+            self.transactions[-1][3] = False
+        self.pins[pin] = value
+
+    def digital_read(self, pin):
+        self.gpioCalls += 1
+        if self.busy.get(pin, 0) > 0:
+            self.busy[pin] -= 1
+            return 0
+        return 1
+
+    def spi_writebyte(self, value):
+        self.writeCalls += 1
+        self.record(bytes([value & 0xff]))
+
+    def spi_writebytes(self, buffer):
+        self.writeCalls += 1
+        self.record(bytes(buffer))
+
+    def spi_readbyte(self, reg):
+        return self.temperature
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def module_init(self):
+        self.pins.clear()
+
+    def module_exit(self):
+        pass
+
+    def data_for(self, controller, command):
+        # All data bytes a controller received after the last occurrence of a command
+        data = None
+        current = None
+        for controllers, dc, payload, _ in self.transactions:
+            if controller not in controllers:
+                continue
+            if dc == 0:
+                current = payload[-1]
+                if current == command:
+                    data = bytearray()
+            elif current == command:
+                data += payload
+        return data
+
+    def reset_counters(self):
+        self.transactions = []
+        self.writeCalls = 0
+        self.gpioCalls = 0
+
+
+if __name__ == "__main__":
+    import display.epd12in48b as eink
+    from PIL import Image
+
+    mock = MockEPDConfig()
+    epd = eink.EPD(backend=mock)
+    epd.Init()
+    black = Image.effect_noise((eink.EPD_WIDTH, eink.EPD_HEIGHT), 64)
+    red = Image.effect_noise((eink.EPD_WIDTH, eink.EPD_HEIGHT), 64)
+
+    mock.reset_counters()
+    start = time.perf_counter()
+    Blackbuf = epd.getbuffer(black)
+    Redbuf = epd.getbuffer(red)
+    packed = time.perf_counter()
+    epd.display_buffers(Blackbuf, Redbuf)
+    end = time.perf_counter()
+    print("pack: %f upload: %f spi calls: %d gpio calls: %d bytes: %d" % (
+        packed - start, end - packed, mock.writeCalls, mock.gpioCalls,
+        sum(len(t[2]) for t in mock.transactions)))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thin display client for a render host running with "frameServerPort" (see run/frameserver.py). The client only
+downloads the packed, quadrant ordered frame and pushes it to the panel, it imports neither the render modules nor
+numpy, Pillow or the Google libraries, which keeps it small and fast to start on a Pi Zero. The server is asked
+again when the frame is planned to change (X-Next-Refresh), at least every pollSeconds, and answers with a 304 while
+the frame on screen is still current.
+Run it on the display with: python -m display.frameclient http://renderhost:8080/frame [--once]
+"""
+
+import datetime as dt
+import logging
+import sys
+import time
+import urllib.error
+import urllib.request
+from display.framecodec import ENCODINGS, FRAME_SIZE, decode
+
+
+class FrameClient:
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self.etag = None  # of the last frame received
+        self.version = None
+        self.nextRefresh = None  # aware datetime the server plans to change the frame, or None
+        self.received = 0  # bytes of the last response body
+
+    def read_headers(self, headers):
+        version = headers.get('X-Frame-Version')
+        self.version = int(version) if version else None
+        nextRefresh = headers.get('X-Next-Refresh')
+        self.nextRefresh = dt.datetime.fromisoformat(nextRefresh) if nextRefresh else None
+
+    def fetch(self):
+        # Returns the frame, or None while the frame of the last call is still current
+        request = urllib.request.Request(self.url, headers={'Accept-Encoding': ', '.join(ENCODINGS)})
+        if self.etag is not None:
+            request.add_header('If-None-Match', self.etag)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                raise
+            self.read_headers(e.headers)
+            self.received = 0
+            return None
+        frame = decode(data, headers.get('Content-Encoding', 'identity'))
+        if len(frame) != FRAME_SIZE:
+            raise ValueError('Frame has {} bytes, expected {}'.format(len(frame), FRAME_SIZE))
+        self.read_headers(headers)
+        self.etag = headers.get('ETag')
+        self.received = len(data)
+        return frame
+
+    def seconds_to_next_fetch(self, pollSeconds=600, margin=60):
+        # until shortly after the planned change, the render host needs a moment to render it
+        if self.nextRefresh is None:
+            return pollSeconds
+        seconds = (self.nextRefresh - dt.datetime.now(dt.timezone.utc)).total_seconds() + margin
+        return min(max(seconds, margin), pollSeconds)
+
+
+def main(url, once=False):
+    from display.display import DisplayHelper
+    from display.epd12in48b import EPD_WIDTH, EPD_HEIGHT
+    logging.basicConfig(format='%(asctime)s %(levelname)s - %(message)s')
+    logger = logging.getLogger('maginkcal')
+    logger.setLevel(logging.INFO)
+    client = FrameClient(url)
+    while True:
+        try:
+            frame = client.fetch()
+            if frame is not None:
+                logger.info('Frame version {} received ({} bytes)'.format(client.version, client.received))
+                displayService = DisplayHelper(EPD_WIDTH, EPD_HEIGHT)
+                displayService.update_frame(frame)
+                displayService.sleep()
+        except (OSError, ValueError) as e:
+            # server unreachable or a broken response, the frame on screen stays
+            logger.error('Frame could not be fetched: {}'.format(e))
+        if once:
+            break
+        time.sleep(client.seconds_to_next_fetch())
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not args:
+        sys.exit('usage: python -m display.frameclient URL [--once]')
+    main(args[0], '--once' in sys.argv)
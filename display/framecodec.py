@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Wire format of the frames served by run/frameserver.py to thin display clients. A frame is the data the four
+controllers of the 12.48" panel receive, in the order they are sent: for every quadrant (S2, M2, M1, S1, see
+QUADRANTS in epd12in48b.py) the black plane slice followed by the inverted red plane slice, 1 bit per pixel, MSB
+first. A client only cuts the frame at fixed offsets and hands the slices to the SPI bus.
+Frames are sent deflate (zlib) or PackBits run-length encoded, PackBits is trivial to decode on a microcontroller.
+Only the standard library is used, so the client side needs neither numpy nor any of the render modules.
+"""
+
+import hashlib
+import re
+import zlib
+from display.epd12in48b import EPD_WIDTH, EPD_HEIGHT, QUADRANTS
+
+ENCODINGS = ('deflate', 'x-packbits', 'identity')
+
+# runs of 3 or more equal bytes are worth a repeat packet, everything in between is sent as literal packets
+RUN = re.compile(rb'(.)\1{2,}', re.DOTALL)
+
+
+def quadrant_size(quadrant):
+    # bytes of one plane slice of a quadrant
+    name, y0, y1, x0, x1 = quadrant
+    return (y1 - y0) * (x1 - x0)
+
+
+FRAME_SIZE = 2 * sum(quadrant_size(quadrant) for quadrant in QUADRANTS)
+
+
+def pack_frame(black, red):
+    # Frame from the packed planes as numpy arrays (rows of bytes, 1 = white), the red plane is inverted like
+    # EPD.display_buffers does before sending it
+    for plane in (black, red):
+        if plane.shape != (EPD_HEIGHT, EPD_WIDTH // 8):
+            raise ValueError('Plane of shape {} does not fit the panel, check imageWidth, imageHeight and '
+                             'rotateAngle'.format(plane.shape))
+    parts = []
+    for name, y0, y1, x0, x1 in QUADRANTS:
+        parts.append(black[y0:y1, x0:x1].tobytes())
+        parts.append((~red[y0:y1, x0:x1]).tobytes())
+    return b''.join(parts)
+
+
+def frame_etag(frame):
+    # HTTP entity tag of a frame, equal frames get the same tag
+    return '"{}"'.format(hashlib.sha1(frame).hexdigest()[:16])
+
+
+def split_frame(frame):
+    # Yields (controller, black data, red data) in the order of the frame
+    if len(frame) != FRAME_SIZE:
+        raise ValueError('Frame has {} bytes, expected {}'.format(len(frame), FRAME_SIZE))
+    view = memoryview(frame)
+    offset = 0
+    for quadrant in QUADRANTS:
+        size = quadrant_size(quadrant)
+        yield quadrant[0], view[offset:offset + size], view[offset + size:offset + 2 * size]
+        offset += 2 * size
+
+
+def encode_packbits(data):
+    # PackBits: a header n of 0..127 is followed by n + 1 literal bytes, a header of 129..255 by one byte that is
+    # repeated 257 - n times
+    out = bytearray()
+
+    def literal(start, end):
+        for i in range(start, end, 128):
+            chunk = data[i:min(i + 128, end)]
+            out.append(len(chunk) - 1)
+            out.extend(chunk)
+
+    position = 0
+    for match in RUN.finditer(data):
+        literal(position, match.start())
+        remaining = match.end() - match.start()
+        while remaining >= 3:
+            count = min(remaining, 128)
+            out.append(257 - count)
+            out.append(data[match.start()])
+            remaining -= count
+        # a rest of 1 or 2 bytes goes into the next literal packet
+        position = match.end() - remaining
+    literal(position, len(data))
+    return bytes(out)
+
+
+def decode_packbits(data):
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        header = data[i]
+        if header < 128:
+            out += data[i + 1:i + header + 2]
+            i += header + 2
+        elif header > 128:
+            out += data[i + 1:i + 2] * (257 - header)
+            i += 2
+        else:
+            i += 1  # 128 is a no-op
+    return bytes(out)
+
+
+def encode(frame, encoding):
+    if encoding == 'deflate':
+        return zlib.compress(frame, 9)
+    if encoding == 'x-packbits':
+        return encode_packbits(frame)
+    return bytes(frame)
+
+
+def decode(data, encoding):
+    if encoding == 'deflate':
+        return zlib.decompress(data)
+    if encoding == 'x-packbits':
+        return decode_packbits(data)
+    return bytes(data)
+
+
+def choose_encoding(acceptEncoding):
+    # the first of our encodings the client accepts, in the order of ENCODINGS
+    accepted = {part.split(';')[0].strip().lower() for part in (acceptEncoding or '').split(',')}
+    for encoding in ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return 'identity'
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keeps the packed black/red framebuffers that are currently shown on the eInk display, so a new render can be compared
+against them before paying for a full refresh of the panel.
+"""
+
+import os
+import logging
+import numpy as np
+
+
+class FrameStore:
+
+    def __init__(self, path, timestampRegion=None):
+        self.logger = logging.getLogger('maginkcal')
+        self.path = path
+        # [left, top, right, bottom] in screen pixels of the "last refreshed" line, changes in there alone don't
+        # justify a full refresh
+        self.timestampRegion = timestampRegion
+
+    def load(self):
+        # Returns (black, red) of the frame on screen, or None if nothing was stored yet
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path) as frame:
+                return frame['black'], frame['red']
+        except (OSError, ValueError, KeyError):
+            self.logger.info('Stored frame could not be read, treating display as unknown')
+            return None
+
+    def save(self, black, red):
+        # write to a temporary file first so an interrupted run never leaves a truncated frame behind
+        tmpPath = self.path + '.tmp.npz'
+        np.savez_compressed(tmpPath, black=black, red=red)
+        os.replace(tmpPath, self.path)
+
+    def compare(self, black, red):
+        # Compares a packed frame against the stored one
+        # state is 'new' (nothing stored), 'identical', 'timestamp' (only the timestamp line changed) or 'changed'
+        diff = {'state': 'new', 'blackBytes': black.size, 'redBytes': red.size, 'totalBytes': black.size + red.size,
+                'bbox': None}
+        last = self.load()
+        if last is None or last[0].shape != black.shape or last[1].shape != red.shape:
+            return diff
+
+        blackChanged = black != last[0]
+        redChanged = red != last[1]
+        diff['blackBytes'] = int(np.count_nonzero(blackChanged))
+        diff['redBytes'] = int(np.count_nonzero(redChanged))
+        changed = blackChanged | redChanged
+        if not changed.any():
+            diff['state'] = 'identical'
+            return diff
+
+        # bounding box in pixels, each byte column covers 8 pixels
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        diff['bbox'] = (int(cols[0]) * 8, int(rows[0]), (int(cols[-1]) + 1) * 8, int(rows[-1]) + 1)
+        diff['state'] = 'timestamp' if self.is_within_timestamp(diff['bbox']) else 'changed'
+        return diff
+
+    def is_within_timestamp(self, bbox):
+        if not self.timestampRegion:
+            return False
+        left, top, right, bottom = self.timestampRegion
+        return bbox[0] >= left and bbox[1] >= top and bbox[2] <= right and bbox[3] <= bottom
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Self-check of the numpy framebuffer packing in EPD.getbuffer against the per-pixel loop it replaced
+(EPD.getbuffer_loop). Random panel sized L, 1 and RGB images are packed both ways and have to give the same bytes,
+the times of both paths are reported. Runs without the hardware, run it from the repository root with:
+python -m display.packcheck [images per mode]
+"""
+
+import sys
+import time
+import numpy as np
+from PIL import Image
+import display.epd12in48b as eink
+from display.epdmock import MockEPDConfig
+
+MODES = ('L', '1', 'RGB')
+
+
+def random_image(rng, mode):
+    if mode == 'RGB':
+        pixels = rng.integers(0, 256, (eink.EPD_HEIGHT, eink.EPD_WIDTH, 3), dtype=np.uint8)
+    else:
+        pixels = rng.integers(0, 256, (eink.EPD_HEIGHT, eink.EPD_WIDTH), dtype=np.uint8)
+    return Image.fromarray(pixels, 'RGB' if mode == 'RGB' else 'L').convert(mode)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    epd = eink.EPD(backend=MockEPDConfig())
+    rng = np.random.default_rng(1)
+    for mode in MODES:
+        packTime = loopTime = 0
+        for _ in range(count):
+            image = random_image(rng, mode)
+            start = time.perf_counter()
+            packed = epd.getbuffer(image)
+            packTime += time.perf_counter() - start
+            start = time.perf_counter()
+            reference = epd.getbuffer_loop(image)
+            loopTime += time.perf_counter() - start
+            assert bytes(packed) == bytes(reference), 'getbuffer differs from the loop for a {} image'.format(mode)
+        print('{:3s} {} images identical, numpy {:8.2f} ms, loop {:8.2f} ms per image'.format(
+            mode, count, packTime / count * 1000, loopTime / count * 1000))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact representation of a calendar event as handed from GcalHelper to the renderers. Start, end and update time are
+kept as epoch seconds, the local start and end day as date ordinals and calendar names are interned, so a month full
+of events stays small and bucketing events into the days of a calendar page is plain integer arithmetic.
+Run this file to compare memory use and bucketing speed with the dictionaries used before.
+"""
+
+import datetime as dt
+import sys
+from operator import attrgetter
+
+
+class Event:
+    __slots__ = ('summary', 'calendar', 'position', 'start', 'end', 'updated', 'startDay', 'endDay', 'allday',
+                 'isUpdated', 'isMultiday', 'tz')
+
+    def __init__(self, summary, calendar, position, startDatetime, endDatetime, updatedDatetime, allday, isUpdated):
+        # the datetimes have to be in the display timezone, the local days are derived from them
+        self.summary = summary
+        self.calendar = sys.intern(calendar)
+        self.position = position
+        self.start = int(startDatetime.timestamp())
+        self.end = int(endDatetime.timestamp())
+        self.updated = int(updatedDatetime.timestamp())
+        self.startDay = startDatetime.toordinal()
+        self.endDay = endDatetime.toordinal()
+        self.allday = allday
+        self.isUpdated = isUpdated
+        self.isMultiday = self.startDay != self.endDay
+        self.tz = startDatetime.tzinfo
+
+    def __repr__(self):
+        return 'Event({!r}, {!r}, {})'.format(self.summary, self.calendar, self.startDatetime.isoformat())
+
+    @property
+    def startDatetime(self):
+        return dt.datetime.fromtimestamp(self.start, self.tz)
+
+    @property
+    def endDatetime(self):
+        return dt.datetime.fromtimestamp(self.end, self.tz)
+
+    @property
+    def updatedDatetime(self):
+        return dt.datetime.fromtimestamp(self.updated, self.tz)
+
+    def starts_on(self, date):
+        return self.startDay == date.toordinal()
+
+    def ends_on(self, date):
+        return self.endDay == date.toordinal()
+
+    def day_range(self, startDate):
+        # first and last day of the event as indices into a calendar page beginning at startDate
+        startOrdinal = startDate.toordinal()
+        return self.startDay - startOrdinal, self.endDay - startOrdinal
+
+
+def bucket_events(events, startDate, dayCount):
+    # Sweep over the days of a calendar page. Every event is filed under the first day it covers on the page and then
+    # stays in the active list until its last day, so it lands on every day it covers in O(n + days + placements).
+    # Returns the events of each day, sorted by start time, and the number of events per day
+    startOrdinal = startDate.toordinal()
+    starting = [[] for i in range(dayCount)]
+    for event in events:
+        first = event.startDay - startOrdinal
+        if event.endDay < startOrdinal or first >= dayCount:
+            continue
+        starting[max(first, 0)].append(event)
+
+    days = []
+    counts = []
+    active = []
+    for idx in range(dayCount):
+        # events still active started earlier than the ones starting today, so the day stays sorted by start
+        active = [event for event in active if event.endDay >= startOrdinal + idx]
+        starting[idx].sort(key=attrgetter('start'))
+        active += starting[idx]
+        days.append(active)
+        counts.append(len(active))
+    return days, counts
+
+
+if __name__ == '__main__':
+    # Memory and bucketing speed of Event against the previous per-event dictionaries, on 10k synthetic events.
+    # The dictionaries are bucketed like before, multiday events only on their first and last day
+    import random
+    import time
+    import tracemalloc
+    import pytz
+
+    tz = pytz.timezone('Europe/Zurich')
+    random.seed(1)
+    calendars = ['Family', 'Work', 'Birthdays', 'Holidays', 'School']
+    base = tz.localize(dt.datetime(2026, 1, 1))
+    specs = []
+    for i in range(10000):
+        start = base + dt.timedelta(minutes=15 * random.randrange(0, 365 * 96))
+        length = dt.timedelta(days=random.randrange(1, 4)) if i % 10 == 0 else dt.timedelta(hours=1)
+        specs.append(('Event {}'.format(i), calendars[i % 5], i % 5, tz.normalize(start),
+                      tz.normalize(start + length), base, i % 7 == 0))
+
+    def make_dicts():
+        # the conversion creates new datetime objects for every event, hence the + timedelta(0)
+        zero = dt.timedelta(0)
+        return [{'summary': s, 'allday': False, 'startDatetime': b + zero, 'endDatetime': e + zero,
+                 'updatedDatetime': u + zero,
+                 'isUpdated': upd, 'isMultiday': b.date() != e.date(), 'calendar': c, 'position': p}
+                for s, c, p, b, e, u, upd in specs]
+
+    def make_events():
+        return [Event(s, c, p, b, e, u, False, upd) for s, c, p, b, e, u, upd in specs]
+
+    def bucket_dicts(events, startDate, dayCount):
+        days = [[] for i in range(dayCount)]
+        for event in events:
+            idx = (event['startDatetime'].date() - startDate).days
+            if 0 <= idx < dayCount:
+                days[idx].append(event)
+            if event['isMultiday']:
+                idxEnd = (event['endDatetime'].date() - startDate).days
+                if 0 <= idxEnd < dayCount:
+                    days[idxEnd].append(event)
+        for day in days:
+            day.sort(key=lambda x: x['startDatetime'])
+        return days
+
+    # the summaries already exist in specs for both variants, only what each representation adds is measured
+    for name, make in [('dict', make_dicts), ('Event', make_events)]:
+        tracemalloc.start()
+        events = make()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print('{:6s} {:8.1f} KiB  {:5.0f} bytes/event'.format(name, size / 1024, size / len(events)))
+
+    dicts = make_dicts()
+    events = make_events()
+    startDate = dt.date(2026, 3, 30)
+    for name, run in [('dict', lambda: bucket_dicts(dicts, startDate, 35)),
+                      ('Event', lambda: bucket_events(events, startDate, 35)[0])]:
+        start = time.perf_counter()
+        for i in range(20):
+            days = run()
+        print('{:6s} bucketing a month of 10k events: {:.2f} ms ({} placements)'.format(
+            name, (time.perf_counter() - start) / 20 * 1000, sum(len(day) for day in days)))
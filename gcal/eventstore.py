@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local store for Google Calendar events. Every calendar is synchronised incrementally with the syncToken /
+nextSyncToken mechanism of the Calendar API, so after the first full download only changed events are transferred.
+Range queries for the calendar views are then answered from the local SQLite database.
+Running this file checks the full, incremental and 410 Gone syncs against gcal/fakeservice.py.
+"""
+
+import datetime as dt
+import json
+import logging
+import sqlite3
+import threading
+from googleapiclient.errors import HttpError
+
+# all-day events are stored at UTC midnight, so range queries are widened by a day and filtered exactly afterwards
+QUERY_SLACK = 24 * 3600
+
+
+class EventStore:
+
+    def __init__(self, path):
+        self.logger = logging.getLogger('maginkcal')
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS events (calendar_id TEXT, event_id TEXT, start_ts INTEGER, '
+                        'end_ts INTEGER, data TEXT, PRIMARY KEY (calendar_id, event_id))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS events_range ON events (calendar_id, start_ts, end_ts)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS sync_state (calendar_id TEXT PRIMARY KEY, sync_token TEXT)')
+        self.db.commit()
+
+    def to_timestamp(self, eventTime):
+        # eventTime is the start or end object of an event, holding either a dateTime or an all-day date
+        if eventTime.get('dateTime') is not None:
+            return int(dt.datetime.fromisoformat(eventTime['dateTime'].replace('Z', '+00:00')).timestamp())
+        day = dt.date.fromisoformat(eventTime['date'])
+        return int(dt.datetime(day.year, day.month, day.day, tzinfo=dt.timezone.utc).timestamp())
+
+    def get_sync_token(self, calendarId):
+        row = self.db.execute('SELECT sync_token FROM sync_state WHERE calendar_id = ?', (calendarId,)).fetchone()
+        return row[0] if row else None
+
+    def sync(self, service, calendarId, http=None):
+        # Bring the local copy of one calendar up to date, returns the number of changed events
+        # Only the database access is serialised, several calendars can be downloaded at the same time
+        with self.lock:
+            syncToken = self.get_sync_token(calendarId)
+        try:
+            return self.sync_pages(service, calendarId, syncToken, http)
+        except HttpError as e:
+            # 410 Gone: the sync token expired or was invalidated, start over with a full sync
+            if syncToken is None or e.resp.status != 410:
+                raise
+            self.logger.info('Sync token for {} expired, running full sync'.format(calendarId))
+            return self.sync_pages(service, calendarId, None, http)
+
+    def sync_pages(self, service, calendarId, syncToken, http=None):
+        # Downloads all pages first and applies them in one transaction, an interrupted sync leaves the store as it was
+        changes = []
+        pageToken = None
+        while True:
+            params = {'calendarId': calendarId, 'singleEvents': True, 'maxResults': 2500}
+            if syncToken is not None:
+                params['syncToken'] = syncToken
+            if pageToken is not None:
+                params['pageToken'] = pageToken
+            result = service.events().list(**params).execute(http=http)
+            changes += result.get('items', [])
+            pageToken = result.get('nextPageToken')
+            if pageToken is None:
+                break
+
+        with self.lock, self.db:
+            if syncToken is None:
+                self.db.execute('DELETE FROM events WHERE calendar_id = ?', (calendarId,))
+            for event in changes:
+                if event.get('status') == 'cancelled':
+                    self.db.execute('DELETE FROM events WHERE calendar_id = ? AND event_id = ?',
+                                    (calendarId, event['id']))
+                else:
+                    self.db.execute('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)',
+                                    (calendarId, event['id'], self.to_timestamp(event['start']),
+                                     self.to_timestamp(event['end']), json.dumps(event)))
+            self.db.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?)',
+                            (calendarId, result.get('nextSyncToken')))
+
+        self.logger.info('{} sync of {}: {} changed events'.format(
+            'Incremental' if syncToken else 'Full', calendarId, len(changes)))
+        return len(changes)
+
+    def query(self, calendarId, startDatetime, endDatetime):
+        # Events of a calendar overlapping the given range (plus a day of slack on both sides), ordered by start
+        with self.lock:
+            rows = self.db.execute('SELECT data FROM events WHERE calendar_id = ? AND end_ts >= ? AND start_ts <= ? '
+                                   'ORDER BY start_ts',
+                                   (calendarId, int(startDatetime.timestamp()) - QUERY_SLACK,
+                                    int(endDatetime.timestamp()) + QUERY_SLACK)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def clear(self, calendarId):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM events WHERE calendar_id = ?', (calendarId,))
+            self.db.execute('DELETE FROM sync_state WHERE calendar_id = ?', (calendarId,))
+
+
+if __name__ == '__main__':
+    from gcal.fakeservice import FakeCalendarService
+
+    service = FakeCalendarService(pageSize=3)
+    store = EventStore(':memory:')
+    base = dt.datetime(2026, 10, 12, 8, tzinfo=dt.timezone.utc)
+    for i in range(8):
+        start = base + dt.timedelta(days=i)
+        service.put_event('family', 'f{}'.format(i), 'Family {}'.format(i), start, start + dt.timedelta(hours=1))
+    service.put_event('family', 'holiday', 'Holiday', base.date(), base.date() + dt.timedelta(days=2), allday=True)
+    startDatetime = base - dt.timedelta(days=1)
+    endDatetime = base + dt.timedelta(days=10)
+
+    def stored_ids():
+        return sorted(event['id'] for event in store.query('family', startDatetime, endDatetime))
+
+    # full sync: 9 events in pages of 3, the sync token of the last page is kept
+    assert store.sync(service, 'family') == 9
+    assert [request['syncToken'] for request in service.requests] == [None] * 3, service.requests
+    assert stored_ids() == sorted(['holiday'] + ['f{}'.format(i) for i in range(8)]), stored_ids()
+    firstToken = store.get_sync_token('family')
+    assert firstToken is not None
+    print('full sync: {} events in {} requests'.format(len(stored_ids()), len(service.requests)))
+
+    # incremental sync: only the cancellation is transferred and removes the event
+    service.cancel_event('family', 'f3')
+    service.requests.clear()
+    assert store.sync(service, 'family') == 1
+    assert [request['syncToken'] for request in service.requests] == [firstToken], service.requests
+    assert 'f3' not in stored_ids() and len(stored_ids()) == 8, stored_ids()
+    secondToken = store.get_sync_token('family')
+    assert secondToken not in (None, firstToken), secondToken
+    print('incremental sync: f3 cancelled, token {} -> {}'.format(firstToken, secondToken))
+
+    # 410 Gone: the expired token falls back to a full sync, which rebuilds the calendar from scratch
+    service.invalidate_sync_tokens()
+    service.cancel_event('family', 'f5')
+    service.put_event('family', 'new', 'New', base + dt.timedelta(hours=3), base + dt.timedelta(hours=4))
+    service.requests.clear()
+    assert store.sync(service, 'family') == 8
+    assert [request['syncToken'] for request in service.requests] == [secondToken, None, None, None], \
+        service.requests
+    expected = sorted(['holiday', 'new'] + ['f{}'.format(i) for i in range(8) if i not in (3, 5)])
+    assert stored_ids() == expected, stored_ids()
+    assert store.get_sync_token('family') not in (None, secondToken)
+    print('410 Gone: full resync, {} events, token {}'.format(len(stored_ids()), store.get_sync_token('family')))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline stand-in for the Calendar v3 service returned by googleapiclient's build(). It implements the parts of
+events().list() and calendarList().list() that GcalHelper and the event store use: time ranges, paging, sync tokens
+(including 410 Gone for invalidated tokens), cancelled events and the fields projection, so the sync and paging
+logic can be exercised without network. Running this file checks the paging of GcalHelper against it.
+"""
+
+import copy
+import datetime as dt
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+def parse_fields(fields):
+    # fields parameter of the API -> tree of the selected keys, e.g. 'a,b(c,d)' -> {'a': None, 'b': {'c': None,
+    # 'd': None}}
+    tree = {}
+    stack = [tree]
+    name = ''
+    for char in fields:
+        if char == '(':
+            stack[-1][name] = {}
+            stack.append(stack[-1][name])
+            name = ''
+        elif char in ',)':
+            if name:
+                stack[-1][name] = None
+            name = ''
+            if char == ')':
+                stack.pop()
+        else:
+            name += char.strip()
+    if name:
+        stack[-1][name] = None
+    return tree
+
+
+def project(value, tree):
+    # keeps only the selected keys, lists are projected item by item
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+class FakeRequest:
+
+    def __init__(self, handler, params):
+        self.handler = handler
+        self.params = params
+
+    def execute(self, http=None, num_retries=0):
+        return self.handler(**self.params)
+
+
+class FakeCollection:
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def list(self, **params):
+        return FakeRequest(self.handler, params)
+
+
+class FakeCalendarService:
+
+    def __init__(self, pageSize=250):
+        self.pageSize = pageSize
+        self.calendars = {}  # calendar id -> {event id: (version, event)}
+        self.version = 0
+        self.validTokens = set()
+        self.requests = []  # parameters of every events().list() call
+
+    def events(self):
+        return FakeCollection(self.list_events)
+
+    def calendarList(self):
+        return FakeCollection(self.list_calendars)
+
+    # --- test helpers ---
+
+    def put_event(self, calendarId, eventId, summary, start, end, updated=None, allday=False):
+        # start/end are datetimes, or dates for all-day events
+        self.version += 1
+        key = 'date' if allday else 'dateTime'
+        # htmlLink stands for the fields GcalHelper does not ask for
+        event = {'id': eventId, 'status': 'confirmed', 'summary': summary,
+                 'htmlLink': 'https://calendar.example/{}/{}'.format(calendarId, eventId),
+                 'start': {key: start.isoformat()}, 'end': {key: end.isoformat()},
+                 'updated': (updated or dt.datetime.now(dt.timezone.utc)).isoformat().replace('+00:00', 'Z')}
+        self.calendars.setdefault(calendarId, {})[eventId] = (self.version, event)
+        return event
+
+    def cancel_event(self, calendarId, eventId):
+        self.version += 1
+        version, event = self.calendars[calendarId][eventId]
+        event = dict(event, status='cancelled')
+        self.calendars[calendarId][eventId] = (self.version, event)
+
+    def invalidate_sync_tokens(self):
+        # makes the next incremental request fail with 410 Gone
+        self.validTokens.clear()
+
+    # --- API ---
+
+    def list_calendars(self, **params):
+        return {'items': [{'id': calendarId, 'summary': calendarId} for calendarId in self.calendars]}
+
+    def list_events(self, calendarId, syncToken=None, pageToken=None, maxResults=None, timeMin=None, timeMax=None,
+                    fields=None, **params):
+        self.requests.append(dict(params, calendarId=calendarId, syncToken=syncToken, pageToken=pageToken,
+                                  maxResults=maxResults, timeMin=timeMin, timeMax=timeMax, fields=fields))
+        if syncToken is not None and syncToken not in self.validTokens:
+            raise HttpError(httplib2.Response({'status': 410}), b'{"error": {"code": 410, "message": "Gone"}}')
+
+        since = int(syncToken[1:].split(':')[0]) if syncToken else 0
+        events = []
+        for version, event in sorted(self.calendars.get(calendarId, {}).values(), key=lambda v: self.sort_key(v[1])):
+            if version <= since:
+                continue
+            if syncToken is None and event['status'] == 'cancelled':
+                continue
+            if timeMin is not None and self.to_datetime(event['end']) <= self.parse(timeMin):
+                continue
+            if timeMax is not None and self.to_datetime(event['start']) >= self.parse(timeMax):
+                continue
+            events.append(copy.deepcopy(event))
+
+        pageSize = min(maxResults or self.pageSize, self.pageSize)
+        offset = int(pageToken) if pageToken else 0
+        result = {'items': events[offset:offset + pageSize]}
+        if offset + pageSize < len(events):
+            result['nextPageToken'] = str(offset + pageSize)
+        elif timeMin is None and timeMax is None:
+            # like the real API, only unbounded listings hand out a sync token on their last page
+            token = 'v{}:{}'.format(self.version, calendarId)
+            self.validTokens.add(token)
+            result['nextSyncToken'] = token
+        if fields is not None:
+            result = project(result, parse_fields(fields))
+        return result
+
+    def parse(self, isoString):
+        return dt.datetime.fromisoformat(isoString.replace('Z', '+00:00'))
+
+    def to_datetime(self, eventTime):
+        if 'dateTime' in eventTime:
+            return self.parse(eventTime['dateTime'])
+        day = dt.date.fromisoformat(eventTime['date'])
+        return dt.datetime(day.year, day.month, day.day, tzinfo=dt.timezone.utc)
+
+    def sort_key(self, event):
+        return self.to_datetime(event['start'])
+
+
+if __name__ == '__main__':
+    import types
+    import pytz
+    import gcal.session
+    from gcal.gcal import EVENT_FIELDS, PAGE_SIZE, GcalHelper
+
+    tz = pytz.timezone('Europe/Zurich')
+    service = FakeCalendarService(pageSize=7)  # the API may return fewer events per page than maxResults
+    base = dt.datetime(2026, 10, 12, 8, tzinfo=dt.timezone.utc)
+    for i in range(23):
+        start = base + dt.timedelta(hours=13 * i)
+        service.put_event('family', 'f{}'.format(i), 'Family {}'.format(i), start, start + dt.timedelta(hours=1))
+    for i in range(9):
+        start = base + dt.timedelta(days=2 * i)
+        service.put_event('work', 'w{}'.format(i), 'Work {}'.format(i), start, start + dt.timedelta(hours=8))
+    service.put_event('family', 'later', 'Outside of the range', base + dt.timedelta(days=60),
+                      base + dt.timedelta(days=60, hours=1))
+    gcal.session._session = types.SimpleNamespace(service=service, creds=None, begin_update=lambda: None,
+                                                  get_http=lambda: None)
+    helper = GcalHelper()
+    startDatetime = tz.localize(dt.datetime(2026, 10, 12))
+    endDatetime = tz.localize(dt.datetime(2026, 11, 8, 23, 59))
+
+    # 23 events in pages of 7: four requests chained by nextPageToken, all with the projection
+    pages = list(helper.fetch_pages('family', startDatetime.isoformat(), endDatetime.isoformat(), startDatetime,
+                                    endDatetime))
+    assert [len(page) for page in pages] == [7, 7, 7, 2], [len(page) for page in pages]
+    assert [request['pageToken'] for request in service.requests] == [None, '7', '14', '21'], service.requests
+    assert all(request['fields'] == EVENT_FIELDS and request['maxResults'] == PAGE_SIZE
+               for request in service.requests)
+    ids = [event['id'] for page in pages for event in page]
+    assert sorted(ids) == sorted('f{}'.format(i) for i in range(23)), ids
+    assert all(set(event) == {'id', 'status', 'summary', 'start', 'end', 'updated'}
+               for page in pages for event in page)
+    print('pages of family:', [len(page) for page in pages], 'tokens:',
+          [request['pageToken'] for request in service.requests])
+
+    # both calendars in parallel and one after the other: every event exactly once, sorted by start
+    for parallel in (1, 2):
+        helper.maxParallelFetches = parallel
+        events = helper.retrieve_events([{'id': 'family', 'name': 'Family', 'position': 1},
+                                         {'id': 'work', 'name': 'Work', 'position': 2}],
+                                        startDatetime, endDatetime, tz, 12)
+        summaries = [event.summary for event in events]
+        assert len(summaries) == len(set(summaries)) == 32, summaries
+        assert [event.start for event in events] == sorted(event.start for event in events)
+        print('{} at a time: {} events, each once'.format(parallel, len(events)))
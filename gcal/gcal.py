@@ -7,52 +7,45 @@ credentials.json and token.pickle in the same folder as this file. If not, run q
 
 from __future__ import print_function
 import datetime as dt
-import pickle
-import os.path
-import pathlib
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from operator import attrgetter
+from gcal.event import Event
+from gcal.session import get_session
 import logging
 
+# events per page requested from the API and the fields actually used, everything else is left out of the response
+PAGE_SIZE = 250
+EVENT_FIELDS = 'nextPageToken,items(id,status,summary,start,end,updated)'
+
 
 class GcalHelper:
 
-    def __init__(self):
+    def __init__(self, eventStore=None, maxParallelFetches=1, timeout=None, countUpdate=True):
         self.logger = logging.getLogger('maginkcal')
-        # Initialise the Google Calendar using the provided credentials and token
-        SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
-        self.currPath = str(pathlib.Path(__file__).parent.absolute())
-
-        creds = None
-        # The file token.json stores the user's access and refresh tokens, and is
-        # created automatically when the authorization flow completes for the first
-        # time.
-        if os.path.exists(self.currPath + '/token.json'):
-            creds = Credentials.from_authorized_user_file(self.currPath + '/token.json', SCOPES)
-            creds.enable_reauth_refresh = True
-        # If there are no (valid) credentials available, let the user log in.
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.currPath + '/credentials.json', SCOPES)
-                
-                authorization_url, state = flow.authorization_url(
-                    access_type='offline',
-                    include_granted_scopes='true')
-                
-                creds = flow.run_local_server(port=0)
-            # Save the credentials for the next run
-            with open(self.currPath + '/token.json', 'w') as token:
-                token.write(creds.to_json())
+        # optional gcal.eventstore.EventStore, events are then synced incrementally and queried locally
+        self.eventStore = eventStore
+        # number of calendars fetched at the same time, 1 fetches them one after the other
+        self.maxParallelFetches = maxParallelFetches
+        # seconds spent per phase, read by the profiler of RunHelper
+        self.timings = {}
+        self.fetchStart = None  # perf_counter when the first request of retrieve_events went out
+        # credentials, service and HTTP transports are shared by every helper of this process
+        start = perf_counter()
+        # timeout in seconds for every request, only taken into account by the helper that sets up the session
+        self.session = get_session(timeout)
+        if countUpdate:
+            self.session.begin_update()
         else:
-            creds.refresh(Request())
-
+            # background fetches (prefetched pages) are no update of their own, they only need a valid token
+            self.session.refresh_if_needed()
+        self.timings['oauth'] = perf_counter() - start
+        self.creds = self.session.creds
+        self.service = self.session.service
 
-        self.service = build('calendar', 'v3', credentials=creds, cache_discovery=False)
+    def get_http(self):
+        # per-thread transport of the shared session, the connections stay open between updates
+        return self.session.get_http()
 
     def list_calendars(self):
         # helps to retrieve ID for calendars within the account
@@ -87,9 +80,71 @@ class GcalHelper:
         else:
             return endTime
 
-    def is_multiday(self, start, end):
-        # check if event stretches across multiple days
-        return start.date() != end.date()
+    def fetch_pages(self, calendarId, minTimeStr, maxTimeStr, startDatetime, endDatetime, http=None):
+        # Yields the raw events of one calendar page by page, either from the API or from the local event store
+        if self.eventStore is not None:
+            self.eventStore.sync(self.service, calendarId, http)
+            yield self.eventStore.query(calendarId, startDatetime, endDatetime)
+            return
+        pageToken = None
+        while True:
+            result = self.service.events().list(calendarId=calendarId, timeMin=minTimeStr,
+                                                timeMax=maxTimeStr, singleEvents=True,
+                                                orderBy='startTime', maxResults=PAGE_SIZE, fields=EVENT_FIELDS,
+                                                pageToken=pageToken).execute(http=http)
+            yield result.get('items', [])
+            pageToken = result.get('nextPageToken')
+            if pageToken is None:
+                break
+
+    def convert_event(self, event, cal, localTZ, thresholdHours):
+        # extracting and converting events data into the compact Event used for rendering
+        if event['start'].get('dateTime') is None:
+            allday = True
+            startDatetime = self.to_datetime(event['start'].get('date'), localTZ)
+        else:
+            allday = False
+            startDatetime = self.to_datetime(event['start'].get('dateTime'), localTZ)
+
+        if event['end'].get('dateTime') is None:
+            endDatetime = self.adjust_end_time(self.to_datetime(event['end'].get('date'), localTZ), localTZ)
+        else:
+            endDatetime = self.adjust_end_time(self.to_datetime(event['end'].get('dateTime'), localTZ), localTZ)
+
+        updatedDatetime = self.to_datetime(event['updated'], localTZ)
+        return Event(event.get('summary', ''), cal["name"], cal["position"], startDatetime, endDatetime,
+                     updatedDatetime, allday, self.is_recent_updated(updatedDatetime, thresholdHours))
+
+    def iter_calendar_events(self, cal, startDatetime, endDatetime, localTZ, thresholdHours):
+        # Streams the converted events of one calendar, a page is converted as soon as it arrives
+        http = self.get_http()
+        pages = self.fetch_pages(cal["id"], startDatetime.isoformat(), endDatetime.isoformat(), startDatetime,
+                                 endDatetime, http)
+        fetchTime = dt.timedelta()
+        eventCount = 0
+        minTimestamp = startDatetime.timestamp()
+        maxTimestamp = endDatetime.timestamp()
+        while True:
+            start = dt.datetime.now()
+            items = next(pages, None)
+            fetchTime += dt.datetime.now() - start
+            if items is None:
+                break
+            for event in items:
+                newEvent = self.convert_event(event, cal, localTZ, thresholdHours)
+                # the local event store answers with some slack around the range
+                if newEvent.end < minTimestamp or newEvent.start > maxTimestamp:
+                    continue
+                eventCount += 1
+                yield newEvent
+        self.timings['fetch ' + cal["name"]] = fetchTime.total_seconds()
+        self.logger.info('Calendar {} retrieved in {} ({} events)'.format(cal["name"], fetchTime, eventCount))
+
+    def iter_events(self, calendars, startDatetime, endDatetime, localTZ, thresholdHours):
+        # Generator over the events of all calendars, in calendar order and not sorted by time.
+        # RenderHelper.process_inputs can consume it directly as calDict['events']
+        for cal in calendars:
+            yield from self.iter_calendar_events(cal, startDatetime, endDatetime, localTZ, thresholdHours)
 
     def retrieve_events(self, calendars, startDatetime, endDatetime, localTZ, thresholdHours):
         # Call the Google Calendar API and return a list of events that fall within the specified dates
@@ -97,60 +152,23 @@ class GcalHelper:
 
         minTimeStr = startDatetime.isoformat()
         maxTimeStr = endDatetime.isoformat()
-        if False:
-            return eventList
 
         self.logger.info('Retrieving events between ' + minTimeStr + ' and ' + maxTimeStr + '...')
-        events_result = []
-        for cal in calendars:
-            events_result.append(
-                self.service.events().list(calendarId=cal["id"], timeMin=minTimeStr,
-                                           timeMax=maxTimeStr, singleEvents=True,
-                                           orderBy='startTime').execute()
-            )
-            events_result[-1]['summary'] = cal["name"]
-            events_result[-1]['position'] = cal["position"]
-
-        events = []
-        for eve in events_result:
-            untagged_events = eve.get('items', [])
-            tagged_events = []
-            for e in untagged_events:
-                e['calendar'] = eve['summary']
-                e['position'] = eve['position']
-                tagged_events.append(e)
-            events += tagged_events
-            # events = events_result.get('items', [])
-
-        if not events:
+        self.fetchStart = perf_counter()
+        if self.maxParallelFetches > 1 and len(calendars) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.maxParallelFetches, len(calendars))) as executor:
+                results = executor.map(
+                    lambda cal: list(self.iter_calendar_events(cal, startDatetime, endDatetime, localTZ,
+                                                               thresholdHours)),
+                    calendars)
+                for events in results:
+                    eventList += events
+        else:
+            eventList = list(self.iter_events(calendars, startDatetime, endDatetime, localTZ, thresholdHours))
+
+        if not eventList:
             self.logger.info('No upcoming events found.')
-        for event in events:
-            # extracting and converting events data into a new list
-            newEvent = {}
-            newEvent['summary'] = event['summary']
-
-            if event['start'].get('dateTime') is None:
-                newEvent['allday'] = True
-                newEvent['startDatetime'] = self.to_datetime(event['start'].get('date'), localTZ)
-            else:
-                newEvent['allday'] = False
-                newEvent['startDatetime'] = self.to_datetime(event['start'].get('dateTime'), localTZ)
-
-            if event['end'].get('dateTime') is None:
-                newEvent['endDatetime'] = self.adjust_end_time(self.to_datetime(event['end'].get('date'), localTZ),
-                                                               localTZ)
-            else:
-                newEvent['endDatetime'] = self.adjust_end_time(self.to_datetime(event['end'].get('dateTime'), localTZ),
-                                                               localTZ)
-
-            newEvent['updatedDatetime'] = self.to_datetime(event['updated'], localTZ)
-            newEvent['isUpdated'] = self.is_recent_updated(newEvent['updatedDatetime'], thresholdHours)
-            newEvent['isMultiday'] = self.is_multiday(newEvent['startDatetime'], newEvent['endDatetime'])
-            newEvent['calendar'] = event['calendar']
-            newEvent['position'] = event['position']
-            eventList.append(newEvent)
 
         # We need to sort eventList because the event will be sorted in "calendar order" instead of hours order
-        # TODO: improve because of double cycle for now is not much cost
-        eventList = sorted(eventList, key=lambda k: k['startDatetime'])
+        eventList = sorted(eventList, key=attrgetter('start'))
         return eventList
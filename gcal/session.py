@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide Google Calendar session. The OAuth credentials are loaded once and only refreshed shortly before they
+expire, the calendar v3 service is built once from a discovery document persisted next to this file, and every
+thread keeps its own authorized HTTP transport so connections to the API are reused across refreshes.
+Use get_session() instead of creating GcalSession directly.
+"""
+
+import datetime as dt
+import functools
+import json
+import logging
+import os.path
+import pathlib
+import threading
+import time
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build, build_from_document
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+
+SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+
+# credentials are refreshed when they expire within this many seconds, a refresh during a fetch is avoided that way
+REFRESH_MARGIN = 300
+
+_session = None
+_sessionLock = threading.Lock()
+
+
+def get_session(timeout=None):
+    # Returns the session shared by all GcalHelper instances of this process, created on first use
+    global _session
+    with _sessionLock:
+        if _session is None:
+            _session = GcalSession(timeout)
+        return _session
+
+
+class GcalSession:
+
+    def __init__(self, timeout=None):
+        self.logger = logging.getLogger('maginkcal')
+        # seconds a connection or a response of the API may take, None for the library defaults
+        self.timeout = timeout
+        self.currPath = str(pathlib.Path(__file__).parent.absolute())
+        self.tokenPath = self.currPath + '/token.json'
+        self.discoveryPath = self.currPath + '/discovery-calendar-v3.json'
+        self.lock = threading.Lock()
+        self.threadLocal = threading.local()
+        self.refreshCount = 0
+        self.updateCount = 0
+        # what loading, refreshing and building cost the first time, which is what every later update saves
+        self.setupTime = 0.0
+        self.timeSaved = 0.0
+
+        start = time.perf_counter()
+        self.creds = self.load_credentials()
+        self.refresh_if_needed()
+        self.service = self.build_service()
+        self.setupTime = time.perf_counter() - start
+        self.logger.info('Gcal session set up in {:.3f}s'.format(self.setupTime))
+
+    def load_credentials(self):
+        creds = None
+        # The file token.json stores the user's access and refresh tokens, and is
+        # created automatically when the authorization flow completes for the first
+        # time.
+        if os.path.exists(self.tokenPath):
+            creds = Credentials.from_authorized_user_file(self.tokenPath, SCOPES)
+            creds.enable_reauth_refresh = True
+        # If there are no usable credentials available, let the user log in.
+        if not creds or not creds.refresh_token:
+            # the interactive flow is only needed once, importing it costs every start otherwise
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(self.currPath + '/credentials.json', SCOPES)
+            flow.authorization_url(access_type='offline', include_granted_scopes='true')
+            creds = flow.run_local_server(port=0)
+            self.save_credentials(creds)
+        return creds
+
+    def save_credentials(self, creds):
+        # Save the credentials for the next run
+        with open(self.tokenPath, 'w') as token:
+            token.write(creds.to_json())
+
+    def expires_soon(self):
+        # without an access token or a known expiry time the token is refreshed to be on the safe side
+        if not self.creds.token or self.creds.expiry is None:
+            return True
+        # google-auth keeps expiry as a naive UTC datetime
+        remaining = self.creds.expiry - dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+        return remaining.total_seconds() < REFRESH_MARGIN
+
+    def refresh_if_needed(self):
+        # Refresh the access token only when it is about to expire, returns True if it was refreshed
+        with self.lock:
+            if not self.expires_soon():
+                return False
+            request = Request()
+            if self.timeout is not None:
+                request = functools.partial(request, timeout=self.timeout)
+            self.creds.refresh(request)
+            self.refreshCount += 1
+            self.save_credentials(self.creds)
+            self.logger.info('Gcal access token refreshed, valid until {} UTC'.format(self.creds.expiry))
+            return True
+
+    def build_service(self):
+        # The discovery document is stored on the first start, later starts build the service without fetching it
+        if not os.path.exists(self.discoveryPath):
+            service = build('calendar', 'v3', credentials=self.creds, cache_discovery=False)
+            with open(self.discoveryPath, 'w') as f:
+                json.dump(service._rootDesc, f)
+        with open(self.discoveryPath) as f:
+            return build_from_document(f.read(), http=self.get_http())
+
+    def get_http(self):
+        # httplib2 is not thread safe, every thread gets its own authorized transport which keeps its connections open
+        if not hasattr(self.threadLocal, 'http'):
+            self.threadLocal.http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=self.timeout))
+        return self.threadLocal.http
+
+    def begin_update(self):
+        # Called once per update, refreshes the token if necessary and reports what reusing the session saved
+        refreshed = self.refresh_if_needed()
+        with self.lock:
+            self.updateCount += 1
+            # the first update paid for the setup itself
+            if self.updateCount == 1:
+                return
+            self.timeSaved += self.setupTime
+            self.logger.info('Gcal session reused ({}token refreshed, {} refreshes in {} updates), ~{:.3f}s saved '
+                             '({:.1f}s in total)'.format('' if refreshed else 'no ', self.refreshCount,
+                                                         self.updateCount, self.setupTime, self.timeSaved))
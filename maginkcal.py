@@ -8,17 +8,21 @@ conversions) that are not tested comprehensively, since my calendar/events are l
 There will also be work needed to adjust the calendar rendering for different screen sizes, such as modifying of the
 CSS stylesheets in the "render" folder.
 """
+from time import perf_counter
+importStart = perf_counter()
+# the calendar, render and display modules are imported by RunHelper in the phase that needs them, the import timer
+# reports what every phase paid for its imports
+from run.profiler import install_import_timer, import_summary, take_import_times
+install_import_timer()
 import datetime as dt
 import sys
 
 from pytz import timezone
-from gcal.gcal import GcalHelper
-from render.render import RenderHelper
-from power.power import PowerHelper
 from run.run import RunHelper
 
 import json
 import logging
+importTime = perf_counter() - importStart
 
 
 def loadConfig():
@@ -66,12 +70,27 @@ def init_logger():
     logger.setLevel(logging.INFO)
 
 def main():
+    start = perf_counter()
     loadConfig()
     init_logger()
+    configTime = perf_counter() - start
+    start = perf_counter()
+    run = RunHelper(config)
+    # startup phases for the profile of the first update
+    run.profiler.add('imports', importTime)
+    run.profiler.add('config', configTime)
+    run.profiler.add('init', perf_counter() - start)
+    startupImports = take_import_times()
+    logger.info('Startup imports took ' + import_summary(startupImports))
+    run.profiler.set('importTimes', startupImports)
+    if config.get('frameServerPort'):
+        # render host for thin display clients, see run/frameserver.py and display/frameclient.py
+        from run.frameserver import FrameServer
+        run.frameServer = FrameServer(config.get('frameServerHost') or '', config['frameServerPort'])
+        run.frameServer.start()
     if buttonPresent:
         from buttons.buttons import ButtonHelper
-        buttons = ButtonHelper(config)
-    run = RunHelper(config)
+        buttons = ButtonHelper(config, run)
     date = dt.datetime.now(displayTZ).date()
     view = defaultView
     startToday= "default"
@@ -79,12 +98,13 @@ def main():
     run.maginkcal(date, view, startToday)
     
     if not piSugar2Present:
-        while True:
-            time = dt.datetime.now(displayTZ)
-            if time.minute == 0:
-                date = dt.datetime.now(displayTZ).date()
-                run.maginkcal(date, view, startToday)
-            pass
+        # sleep until the next refresh is due instead of polling the time
+        from run.scheduler import Scheduler, Clock
+        # in the smart refresh mode the next refresh is the one planned from the events of the last update
+        planner = (lambda: run.nextRefresh) if config.get('refreshMode', 'interval') == 'smart' else None
+        scheduler = Scheduler(Clock(displayTZ), config.get('refreshIntervalMinutes', 60), config.get('quietHours'),
+                              planner)
+        scheduler.run_forever(lambda now: run.maginkcal(now.date(), view, startToday))
 
 
 
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local fake of the PiSugar server for development without the hardware. It listens on a free port of 127.0.0.1, answers
+the commands PiSugarClient sends, records them and can push button events or stay silent to provoke timeouts.
+Run this file to check the client against it.
+"""
+
+import datetime as dt
+import socket
+import threading
+
+
+class FakePiSugarServer:
+
+    def __init__(self, battery=87.5):
+        self.battery = battery
+        self.charging = False
+        self.rtcTime = dt.datetime(2026, 10, 18, 6, 0, tzinfo=dt.timezone.utc)
+        self.alarm = None
+        self.commands = []
+        self.connections = 0
+        self.silent = False  # stop answering, for timeout checks
+        self.pushEvent = None  # button event sent before the next answer, e.g. 'single'
+        self.clients = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self.accept, name='fake-pisugar', daemon=True)
+        self.thread.start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, address = self.server.accept()
+            except OSError:
+                break
+            self.connections += 1
+            self.clients.append(conn)
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def answer(self, command):
+        parts = command.split()
+        if parts[:2] == ['get', 'battery']:
+            return 'battery: {}'.format(self.battery)
+        if parts[:2] == ['get', 'battery_charging']:
+            return 'battery_charging: {}'.format('true' if self.charging else 'false')
+        if parts[:2] == ['get', 'rtc_time']:
+            return 'rtc_time: {}'.format(self.rtcTime.isoformat())
+        if parts[:1] == ['rtc_rtc2pi']:
+            return 'rtc_rtc2pi: done'
+        if parts[:1] == ['rtc_alarm_set'] and len(parts) == 3:
+            self.alarm = (dt.datetime.fromisoformat(parts[1]), int(parts[2]))
+            return 'rtc_alarm_set: done'
+        return 'Invalid request.'
+
+    def serve(self, conn):
+        buffer = b''
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(4096)
+                except OSError:
+                    break
+                if not data:
+                    break
+                buffer += data
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    command = line.decode('utf-8').strip()
+                    self.commands.append(command)
+                    if self.silent:
+                        continue
+                    if self.pushEvent is not None:
+                        conn.sendall(self.pushEvent.encode('utf-8') + b'\n')
+                        self.pushEvent = None
+                    conn.sendall(self.answer(command).encode('utf-8') + b'\n')
+
+    def drop_connections(self):
+        # simulates a restart of the PiSugar server
+        for conn in self.clients:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # already closed by the client
+        self.clients = []
+
+    def close(self):
+        # shutdown wakes up the thread blocked in accept, close alone keeps the port open until it returns
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        self.drop_connections()
+
+
+if __name__ == '__main__':
+    from power.pisugar import PiSugarClient, PiSugarError
+
+    server = FakePiSugarServer()
+    client = PiSugarClient(port=server.port, timeout=0.5)
+
+    # one connection for all commands, typed results
+    assert client.get_battery() == 87.5
+    assert client.get_battery_charging() is False
+    assert client.get_rtc_time() == server.rtcTime
+    client.rtc_rtc2pi()
+    wakeUp = dt.datetime(2026, 10, 19, 6, 0, tzinfo=dt.timezone(dt.timedelta(hours=2)))
+    client.rtc_alarm_set(wakeUp, 2)
+    assert server.alarm == (wakeUp, 2) and server.connections == 1
+    print('commands over one connection:', server.commands)
+
+    # pushed button events are skipped
+    server.pushEvent = 'single'
+    assert client.get_battery() == 87.5
+
+    # a dropped connection is reopened transparently
+    server.drop_connections()
+    server.battery = 55.0
+    assert client.get_battery() == 55.0 and server.connections == 2
+    print('reconnected after drop, connections:', server.connections)
+
+    # a silent server raises after the timeout instead of blocking the update
+    server.silent = True
+    try:
+        client.get_battery()
+        raise AssertionError('expected a timeout')
+    except PiSugarError as e:
+        print('timeout:', e)
+    server.silent = False
+    assert client.get_battery() == 55.0
+
+    # unknown commands are reported
+    try:
+        client.request('get nonsense')
+        raise AssertionError('expected an error')
+    except PiSugarError as e:
+        print('invalid:', e)
+    server.close()
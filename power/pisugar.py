@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client for the TCP interface of the PiSugar power manager server (pisugar-server, 127.0.0.1:8423). Commands are sent
+as text lines over one connection that is kept open across commands and updates, instead of spawning echo and nc for
+every command. Responses come back as "<name>: <value>" lines and are converted to Python types. The server also
+pushes button events ("single", "double", "long") to connected clients, those lines are skipped.
+power/fakepisugar.py provides a local fake server.
+"""
+
+import datetime as dt
+import logging
+import socket
+import threading
+
+HOST = '127.0.0.1'
+PORT = 8423
+
+_client = None
+_clientLock = threading.Lock()
+
+
+def get_client():
+    # Returns the client shared by all PowerHelper instances of this process, the connection is opened on first use
+    global _client
+    with _clientLock:
+        if _client is None:
+            _client = PiSugarClient()
+        return _client
+
+
+class PiSugarError(Exception):
+    pass
+
+
+class PiSugarClient:
+
+    def __init__(self, host=HOST, port=PORT, timeout=2.0):
+        self.logger = logging.getLogger('maginkcal')
+        self.host = host
+        self.port = port
+        self.timeout = timeout  # seconds for connecting and for every response
+        self.sock = None
+        self.buffer = b''
+        self.lock = threading.Lock()
+        self.connectCount = 0
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.buffer = b''
+        self.connectCount += 1
+
+    def close(self):
+        with self.lock:
+            self.disconnect()
+
+    def disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def read_line(self):
+        while b'\n' not in self.buffer:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError('PiSugar server closed the connection')
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line.decode('utf-8').strip()
+
+    def exchange(self, command, name):
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(command.encode('utf-8') + b'\n')
+        while True:
+            line = self.read_line()
+            if line.startswith(name + ':'):
+                return line[len(name) + 1:].strip()
+            if line.lower().startswith('invalid'):
+                raise PiSugarError('{}: {}'.format(command, line))
+            # anything else is a pushed button event or a late answer to an earlier command
+
+    def request(self, command):
+        # Send one command and return the value of its response line. A connection the server dropped in the
+        # meantime is reopened once, timeouts and repeated failures raise PiSugarError
+        name = command.split()[1] if command.startswith('get ') else command.split()[0]
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    return self.exchange(command, name)
+                except socket.timeout:
+                    self.disconnect()
+                    raise PiSugarError('{}: no response within {}s'.format(command, self.timeout))
+                except OSError as e:
+                    self.disconnect()
+                    if attempt == 1:
+                        raise PiSugarError('{}: {}'.format(command, e))
+
+    def request_done(self, command):
+        result = self.request(command)
+        if result != 'done':
+            raise PiSugarError('{}: {}'.format(command, result))
+
+    def get_battery(self):
+        # battery level in percent
+        return float(self.request('get battery'))
+
+    def get_battery_charging(self):
+        return self.request('get battery_charging') == 'true'
+
+    def get_rtc_time(self):
+        return dt.datetime.fromisoformat(self.request('get rtc_time'))
+
+    def rtc_rtc2pi(self):
+        # set the system time from the RTC
+        self.request_done('rtc_rtc2pi')
+
+    def rtc_alarm_set(self, datetime, repeat):
+        # wake up at the time of the timezone aware datetime on the weekdays of the repeat bitmask (Sunday = bit 0)
+        self.request_done('rtc_alarm_set {} {}'.format(datetime.isoformat(), repeat))
@@ -5,40 +5,37 @@ This script exposes the functions to interface with PiSugar. Mainly to retrieve
 to trigger the syncing of the PiSugar
 """
 
-import subprocess
 import logging
+from power.pisugar import get_client, PiSugarError
 
 class PowerHelper:
 
-    def __init__(self):
+    def __init__(self, client=None):
         self.logger = logging.getLogger('maginkcal')
+        # shared PiSugarClient, the connection to the PiSugar server is kept open between updates
+        self.client = client if client is not None else get_client()
 
     def get_battery(self):
-        # start displaying on eink display
-        # command = ['echo "get battery" | nc -q 0 127.0.0.1 8423']
         battery_float = -1
         try:
-            ps = subprocess.Popen(('echo', 'get battery'), stdout=subprocess.PIPE)
-            result = subprocess.check_output(('nc', '-q', '0', '127.0.0.1', '8423'), stdin=ps.stdout)
-            ps.wait()
-            result_str = result.decode('utf-8').rstrip()
-            battery_level = result_str.split()[-1]
-            battery_float = float(battery_level)
-            #battery_level = "{:.3f}".format(battery_float)
-        except (ValueError, subprocess.CalledProcessError) as e:
-            self.logger.info('Invalid battery output')
+            battery_float = self.client.get_battery()
+        except (ValueError, PiSugarError) as e:
+            self.logger.info('Invalid battery output: {}'.format(e))
         return battery_float
 
     def set_next_boot_datetime(self, datetime):
-        # TODO: For directly scheduling next boot instead of using PiSugar's web interface
-        # Currently, it can be done manually through the PiSugar web interface
-        return True
+        # Schedule the next boot with the PiSugar RTC alarm instead of the PiSugar web interface. The alarm repeats on
+        # the weekdays set in a bitmask (Sunday = bit 0), only the weekday of the given timezone aware datetime is set
+        try:
+            self.client.rtc_alarm_set(datetime, 1 << (datetime.isoweekday() % 7))
+            return True
+        except PiSugarError as e:
+            self.logger.info('Invalid alarm set command: {}'.format(e))
+            return False
 
     def sync_time(self):
         # To sync PiSugar RTC with current time
         try:
-            ps = subprocess.Popen(('echo', 'rtc_rtc2pi'), stdout=subprocess.PIPE)
-            result = subprocess.check_output(('nc', '-q', '0', '127.0.0.1', '8423'), stdin=ps.stdout)
-            ps.wait()
-        except subprocess.CalledProcessError:
-            self.logger.info('Invalid time sync command')
\ No newline at end of file
+            self.client.rtc_rtc2pi()
+        except PiSugarError as e:
+            self.logger.info('Invalid time sync command: {}'.format(e))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark of the colour separation in render.channels against the previous one in RenderHelper.render_image
+(cv2.inRange, a full copy of the screenshot, np.where index tuples, cv2.rotate per plane, then PIL and pack_image).
+Both turn a synthetic 1304x984 BGRA screenshot into packed black and red planes, unrotated and rendered in portrait
+and rotated by 90 degrees. Reports the best time and the peak of the numpy allocations (tracemalloc), run it from the
+repository root with: python -m render.channelbench
+"""
+
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image
+from display.epd12in48b import pack_image
+from render.channels import separate_channels
+
+ROTATIONS = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+
+
+def separate_channels_old(img, angle=0):
+    # the separation as it was before, kept here for comparison only
+    lower_red = np.array([0,0,128,255])
+    upper_red = np.array([128,128,255,255])
+    mask = cv2.inRange(img, lower_red, upper_red)
+    redimg = img.copy()
+    redimg[np.where(mask==0)] = 255
+    blackimg = img[:,:,2]
+    if angle:
+        redimg = cv2.rotate(redimg, ROTATIONS[angle])
+        blackimg = cv2.rotate(blackimg, ROTATIONS[angle])
+    blackimg = Image.fromarray(blackimg)
+    redimg = Image.fromarray(cv2.cvtColor(redimg, cv2.COLOR_BGRA2RGBA))
+    return pack_image(blackimg), pack_image(redimg)
+
+
+def make_screenshot(width, height):
+    # white page with black, grey and red text-like speckles and a few red blocks
+    rng = np.random.default_rng(1)
+    img = np.full((height, width, 4), 255, dtype=np.uint8)
+    text = rng.random((height, width)) < 0.08
+    img[text, :3] = 0
+    img[rng.random((height, width)) < 0.02, :3] = (125, 117, 108)
+    img[rng.random((height, width)) < 0.02, :3] = (0, 0, 220)
+    for top in range(40, height - 60, 160):
+        img[top:top + 24, 60:400, :3] = (30, 30, 200)
+    return img
+
+
+def measure(separate, img, angle, repeat=10):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        separate(img, angle)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    separate(img, angle)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+if __name__ == '__main__':
+    for angle, (width, height) in ((0, (1304, 984)), (90, (984, 1304))):
+        img = make_screenshot(width, height)
+        old = measure(separate_channels_old, img, angle)
+        new = measure(lambda img, angle: separate_channels(img, angle, dither=False), img, angle)
+        dithered = measure(separate_channels, img, angle)
+        print('{}x{} rotated {}:'.format(width, height, angle))
+        for name, (seconds, peak) in (('previous', old), ('threshold', new), ('dithered', dithered)):
+            print('  {:10s} {:7.2f} ms  peak {:6.2f} MB'.format(name, seconds * 1000, peak / 2 ** 20))
+        # the red plane covers exactly the pixels of the previous inRange mask, which pack_image used to dither
+        mask = cv2.inRange(img, np.array([0,0,128,255]), np.array([128,128,255,255]))
+        if angle:
+            mask = cv2.rotate(mask, ROTATIONS[angle])
+        assert (np.packbits(mask == 0, axis=1) == separate_channels(img, angle)[1]).all()
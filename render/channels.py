@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Colour separation of the rendered BGRA screenshot into the two 1-bit planes of the display. Both planes are computed
+with boolean masks straight from the screenshot buffer and packed into the framebuffer layout of the panel (rows of
+bytes, MSB first, 1 = white), the rotation into screen orientation is a view that packbits reads through, so no
+rotated or full colour copy of the image is made.
+run python -m render.channelbench to compare it against the previous separation.
+"""
+
+import numpy as np
+
+# pixels whose red channel is below this are black, unless the black plane is dithered
+BLACK_THRESHOLD = 128
+# inclusive BGRA bounds of the pixels that are shown red
+RED_LOWER = (0, 0, 128, 255)
+RED_UPPER = (128, 128, 255, 255)
+
+# 4x4 Bayer matrix, grey pixels (e.g. muted text) become a pattern of black and white instead of solid black
+BAYER = np.array([[0, 8, 2, 10], [12, 4, 14, 6], [3, 11, 1, 9], [15, 7, 13, 5]]) * 16 + 8
+
+# clockwise rotation into screen orientation -> counterclockwise quarter turns of np.rot90
+QUARTER_TURNS = {0: 0, 90: 3, 180: 2, 270: 1}
+
+
+# tiled Bayer thresholds by image size
+ditherThresholds = {}
+
+
+def dither_thresholds(shape):
+    if shape not in ditherThresholds:
+        tiles = (-(-shape[0] // 4), -(-shape[1] // 4))
+        ditherThresholds[shape] = np.tile(BAYER.astype(np.uint8), tiles)[:shape[0], :shape[1]]
+    return ditherThresholds[shape]
+
+
+def red_mask(img, lower=RED_LOWER, upper=RED_UPPER):
+    # same pixels as cv2.inRange(img, lower, upper) != 0, bounds that cover the whole 0-255 range are skipped
+    mask = np.ones(img.shape[:2], dtype=bool)
+    scratch = np.empty(img.shape[:2], dtype=bool)
+    for channel in range(img.shape[2]):
+        if lower[channel] > 0:
+            np.greater_equal(img[:, :, channel], lower[channel], out=scratch)
+            mask &= scratch
+        if upper[channel] < 255:
+            np.less_equal(img[:, :, channel], upper[channel], out=scratch)
+            mask &= scratch
+    return mask
+
+
+def pack_plane(white, angle=0):
+    # rotate the boolean plane (True = white) clockwise by angle and pack it into rows of bytes
+    return np.packbits(np.rot90(white, QUARTER_TURNS[angle]), axis=1)
+
+
+def separate_channels(img, angle=0, blackThreshold=BLACK_THRESHOLD, redLower=RED_LOWER, redUpper=RED_UPPER,
+                      dither=True):
+    # Returns the packed black and red planes of a BGRA (or BGR) image. The black plane is taken from the red channel,
+    # so red pixels are white on it. With dither the pixels are compared against an ordered dither pattern instead
+    # of the fixed black threshold, which keeps grey text grey like the previous Floyd-Steinberg conversion did
+    threshold = dither_thresholds(img.shape[:2]) if dither else blackThreshold
+    white = img[:, :, 2] >= threshold
+    black = pack_plane(white, angle)
+    # the red mask is turned into its white plane in place
+    notRed = red_mask(img, redLower, redUpper)
+    np.logical_not(notRed, out=notRed)
+    red = pack_plane(notRed, angle)
+    return black, red
+
+
+def unpack_plane(plane):
+    # packed plane -> 8 bit grayscale image (0 or 255), for the debug images
+    return np.unpackbits(plane, axis=1) * np.uint8(255)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache for the rendered day cells of a calendar page. Between two hourly refreshes most days show exactly the same
+events, so the HTML of a day (RenderHelper) or its drawn tiles (PilRenderHelper) are kept and reused as long as the
+date, the events of that day, the view and the style options are the same. Only changed days are regenerated.
+"""
+
+from collections import OrderedDict
+from time import perf_counter
+
+
+def day_key(currDate, events, view, style):
+    # events are reduced to everything that ends up in the cell, the hash keeps the key small
+    eventsHash = hash(tuple((e.summary, e.calendar, e.position, e.start, e.end, e.allday, e.isUpdated)
+                            for e in events))
+    return currDate, eventsHash, view, style
+
+
+class FragmentCache:
+
+    def __init__(self, maxSize=256):
+        # LRU of rendered day cells, a month page has 35 of them
+        self.maxSize = maxSize
+        self.fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.regenerationTime = 0.0
+
+    def begin(self):
+        # reset the statistics at the start of a page
+        self.hits = 0
+        self.misses = 0
+        self.regenerationTime = 0.0
+
+    def get_or_render(self, key, render):
+        # returns the cached fragment for key, or calls render() and caches its result
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            self.fragments.move_to_end(key)
+            self.hits += 1
+            return fragment
+        start = perf_counter()
+        fragment = render()
+        self.regenerationTime += perf_counter() - start
+        self.misses += 1
+        self.fragments[key] = fragment
+        while len(self.fragments) > self.maxSize:
+            self.fragments.popitem(last=False)
+        return fragment
+
+    def stats(self):
+        # statistics of the page since begin(), handed back to RunHelper with the render result
+        return {'hits': self.hits, 'misses': self.misses, 'regenerationTime': self.regenerationTime}
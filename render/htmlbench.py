@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark of the HTML generation in RenderHelper.build_html against the previous string concatenation, which
+read calendar_template.html on every call. build_html is measured with an empty and with a warm fragment cache.
+Renders a dense month view with 25 events per day shown, run it from the repository root with:
+python -m render.htmlbench
+The reference escapes the summaries like build_html does, both have to produce the same page.
+"""
+
+import calendar
+import datetime as dt
+import random
+import time
+from datetime import timedelta
+from html import escape
+import pytz
+from gcal.event import Event
+from render import render
+from render.render import RenderHelper
+
+
+def build_html_concat(self, calDict):
+    # the generation as it was before, kept here for comparison only
+    maxEventsPerDay = calDict['maxEventsPerDay']
+    batteryDisplayMode = calDict['batteryDisplayMode']
+    dayOfWeekText = calDict['dayOfWeekText']
+    weekStartDay = calDict['weekStartDay']
+    is24hour = calDict['is24hour']
+    weekCount = round(calDict['calRange'] / 7)
+    calList, dayCounts = self.get_cal_list(calDict, weekCount)
+
+    with open(self.currPath + '/calendar_template.html', 'r') as file:
+        calendar_template = file.read()
+    month_name = calendar.month_name[calDict['referenceDay'].month]
+    battText = self.get_battery_text(batteryDisplayMode, calDict['batteryLevel'])
+
+    # Populate the day of week row
+    cal_days_of_week = ''
+    for i in range(0, 7):
+        cal_days_of_week += '<li class="font-weight-bold text-uppercase">' + escape(dayOfWeekText[
+            (i + weekStartDay) % 7]) + "</li>\n"
+    # Populate the date and events
+    maxEventsPerDay = self.get_max_events_per_day(maxEventsPerDay, weekCount)
+    cal_events_text = ''
+    for i in range(len(calList)):
+        calGroup = ''
+        currDate = calDict['calStartDate'] + timedelta(days=i)
+        dayOfMonth = currDate.day
+        if currDate == calDict['today']:
+            cal_events_text += '<li><div class="datecircle">' + str(dayOfMonth) + '</div>\n'
+        elif currDate.month != calDict['referenceDay'].month:
+            cal_events_text += '<li><div class="date text-muted">' + str(dayOfMonth) + '</div>\n'
+        else:
+            cal_events_text += '<li><div class="date">' + str(dayOfMonth) + '</div>\n'
+        
+        if dayCounts[i] <= maxEventsPerDay:
+            maxEvents = maxEventsPerDay
+        elif dayCounts[i] > maxEventsPerDay:
+            maxEvents = maxEventsPerDay - 1
+        for j in range(min(dayCounts[i], maxEvents)):
+            event = calList[i][j]
+            if weekCount < 3:
+                if event.calendar != calGroup:
+                    calGroup = event.calendar
+                    cal_events_text += '<div class="group">' + escape(calGroup) + '</div>\n'
+            cal_events_text += '<div class="event'
+            if event.isUpdated:
+                cal_events_text += ' text-red'
+            elif currDate.month != calDict['referenceDay'].month:
+                cal_events_text += ' text-muted'
+            if event.isMultiday:
+                if event.starts_on(currDate):
+                    cal_events_text += '">►' + escape(event.summary)
+                elif event.ends_on(currDate):
+                    cal_events_text += '">◄' + escape(event.summary)
+                else:
+                    cal_events_text += '">◄►' + escape(event.summary)
+            elif event.allday:
+                if event.summary[-14:] == 'hat Geburtstag':
+                    cal_events_text += '"><img src="media/cake.png" /> ' + escape(event.summary[:-15])
+                else:
+                    cal_events_text += '">' + escape(event.summary)
+            else:
+                cal_events_text += '">' + self.get_short_time(event.startDatetime, is24hour) + ' ' + escape(event.summary)
+            cal_events_text += '</div>\n'
+        if dayCounts[i] > maxEventsPerDay:
+            cal_events_text += '<div class="event text-muted">' + str(dayCounts[i] - (maxEvents)) + ' more'
+        cal_events_text += '</li>\n'
+
+    return calendar_template.format(base=self.baseHref, month=month_name, battText=battText,
+                                    dayOfWeek=cal_days_of_week, weeks=weekCount, events=cal_events_text,
+                                    time=calDict['time'])
+
+
+def make_cal_dict():
+    # dense month view of 1500 random events, some of them multi-day, all-day or ongoing
+    tz = pytz.timezone('Europe/Zurich')
+    random.seed(1)
+    startDate = dt.date(2026, 9, 28)
+    events = []
+    for i in range(1500):
+        start = tz.localize(dt.datetime.combine(startDate + timedelta(days=random.randrange(35)),
+                                                dt.time(random.randrange(7, 21), random.choice([0, 15, 30]))))
+        end = start + (timedelta(days=random.randrange(1, 4)) if i % 20 == 0 else timedelta(hours=1))
+        events.append(Event('Event {} & co. <b>'.format(i), random.choice(['Family', 'Work', 'School']),
+                            random.randrange(3), start, end, start, i % 30 == 0, i % 9 == 0))
+    calDict = {'events': events, 'calStartDate': startDate, 'today': dt.date(2026, 10, 18), 'lastRefresh': None,
+               'batteryLevel': 70, 'batteryDisplayMode': 1, 'dayOfWeekText': ['Mo', 'Di', 'Mi', 'Do', 'Fr', 'Sa', 'So'],
+               'weekStartDay': 0, 'maxEventsPerDay': 25, 'is24hour': True, 'calRange': 35,
+               'referenceDay': dt.date(2026, 10, 18), 'time': '18.10.2026 12:00:00'}
+    return calDict
+
+
+if __name__ == '__main__':
+    calDict = make_cal_dict()
+    helper = RenderHelper(1304, 984, 0)
+    runs = 200
+    def build_html_cold(self, calDict):
+        # nothing cached: no day cells, UTC offsets or start times
+        self.fragmentCache.fragments.clear()
+        render.dayOffsets.clear()
+        render.shortTimes.clear()
+        return self.build_html(calDict)
+
+    # warm: every day comes from the fragment cache, as on an hourly refresh without changes
+    reference = build_html_concat(helper, calDict)
+    for name, build in [('concatenation', build_html_concat), ('compiled template', build_html_cold),
+                        ('warm fragments', RenderHelper.build_html)]:
+        html = build(helper, calDict)
+        # both generate the same page, the event summaries escaped
+        assert html == reference, name
+        start = time.perf_counter()
+        for i in range(runs):
+            build(helper, calDict)
+        print('{:18s} {:7.2f} ms per month view, {} characters'.format(
+            name, (time.perf_counter() - start) / runs * 1000, len(html)))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Native alternative to the HTML/wkhtmltoimage rendering in render.py. The week, 2-week and month grids are drawn
+straight onto two 1-bit images (black and red) with Pillow and the bundled Quattrocento fonts, so no browser process,
+no screenshot and no PNG round trip is involved. The layout follows calendar_template.html and styles.css as closely
+as Pillow allows. Select it with "renderBackend": "pil" in config.json.
+"""
+
+from datetime import timedelta
+from time import perf_counter
+import os
+import calendar
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from render.render import RenderHelper
+from render.channels import pack_plane, unpack_plane
+from render.fragments import day_key
+
+# base layout is designed for the 1304x984 panel and scaled for other image sizes
+BASE_WIDTH = 1304
+BASE_HEIGHT = 984
+
+# fill values for the black plane, muted text is dithered like the grey text of the HTML rendering
+BLACK = 0
+MUTED = 108
+WHITE = 255
+
+# crop offsets of the different levels in media/battery.png, see div.batt_container in styles.css
+BATTERY_SPRITES = {'battery80': 0, 'battery60': 44, 'battery40': 89, 'battery20': 134, 'battery0': 178}
+
+
+class PilRenderHelper(RenderHelper):
+
+    def __init__(self, width, height, angle, saveDebugImages=False, fragmentCacheSize=256, workDir=None):
+        super().__init__(width, height, angle, saveDebugImages, fragmentCacheSize, workDir)
+        self.scale = min(width / BASE_WIDTH, height / BASE_HEIGHT)
+        self.fonts = {}
+        self.media = {}
+
+    def get_font(self, size, bold=False):
+        # fonts are loaded once per helper, the same sizes are used over and over again
+        size = max(1, int(round(size * self.scale)))
+        key = (size, bold)
+        if key not in self.fonts:
+            fontFile = 'Quattrocento-Bold.ttf' if bold else 'Quattrocento-Regular.ttf'
+            self.fonts[key] = ImageFont.truetype(self.currPath + '/' + fontFile, size)
+        return self.fonts[key]
+
+    def get_media(self, name):
+        # icons are flattened onto white and kept as greyscale
+        if name not in self.media:
+            icon = Image.open(self.currPath + '/media/' + name + '.png').convert('RGBA')
+            background = Image.new('RGBA', icon.size, (255, 255, 255, 255))
+            self.media[name] = Image.alpha_composite(background, icon).convert('L')
+        return self.media[name]
+
+    def fit_text(self, text, font, maxWidth):
+        # shorten text with an ellipsis until it fits, like text-overflow: ellipsis
+        if font.getlength(text) <= maxWidth:
+            return text
+        # binary search for the longest prefix that still fits, measuring text is not cheap
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if font.getlength(text[:mid] + '…') <= maxWidth:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low] + '…' if low else ''
+
+    def draw_text(self, canvas, xy, text, font, colour):
+        # colour is one of 'black', 'muted', 'red' or 'white' (white on the red date circle)
+        drawBlack, drawRed = canvas
+        if colour == 'red':
+            drawRed.text(xy, text, font=font, fill=0)
+        elif colour == 'white':
+            drawRed.text(xy, text, font=font, fill=1)
+        else:
+            drawBlack.text(xy, text, font=font, fill=MUTED if colour == 'muted' else BLACK)
+
+    def draw_marker(self, canvas, x, y, size, direction, colour):
+        # multiday markers, the bundled fonts have no glyphs for ► and ◄
+        drawBlack, drawRed = canvas
+        if direction == 'right':
+            points = [(x, y), (x + size, y + size / 2), (x, y + size)]
+        else:
+            points = [(x + size, y), (x, y + size / 2), (x + size, y + size)]
+        if colour == 'red':
+            drawRed.polygon(points, fill=0)
+        else:
+            drawBlack.polygon(points, fill=MUTED if colour == 'muted' else BLACK)
+
+    def draw_header(self, canvas, blackImage, calDict, battText):
+        s = self.scale
+        width = self.imageWidth
+
+        self.draw_text(canvas, (width * 590 / BASE_WIDTH, 5 * s), calDict['time'], self.get_font(12), 'muted')
+
+        # navigation icons, matching the button positions
+        for name, left in [('home', 55), ('view', 155), ('previous', width / s - 200), ('next', width / s - 100)]:
+            icon = self.get_media(name)
+            if s != 1:
+                icon = icon.resize((int(icon.width * s), int(icon.height * s)))
+            blackImage.paste(icon, (int(left * s), int(10 * s)))
+
+        if battText in BATTERY_SPRITES:
+            top = BATTERY_SPRITES[battText]
+            sprite = self.get_media('battery').crop((0, top, 53, top + 27))
+            if s != 1:
+                sprite = sprite.resize((int(53 * s), int(27 * s)))
+            blackImage.paste(sprite, (int(width * 925 / BASE_WIDTH), int(5 * s)))
+
+        # month name, centred like the h3 in the template
+        monthFont = self.get_font(160)
+        month = calendar.month_name[calDict['referenceDay'].month].upper()
+        monthWidth = monthFont.getlength(month)
+        self.draw_text(canvas, ((width - monthWidth) / 2, 16 * s), month, monthFont, 'black')
+        return 16 * s + monthFont.size
+
+    def draw_day_names(self, canvas, top, dayOfWeekText, weekStartDay):
+        s = self.scale
+        font = self.get_font(48, bold=True)
+        cellWidth = (self.imageWidth - 32 * s) / 7
+        for i in range(0, 7):
+            text = dayOfWeekText[(i + weekStartDay) % 7].upper()
+            left = 16 * s + i * cellWidth + (cellWidth - font.getlength(text)) / 2
+            self.draw_text(canvas, (left, top), text, font, 'black')
+        return top + font.size + 16 * s
+
+    def draw_day(self, canvas, blackImage, box, currDate, events, eventCount, calDict, weekCount, maxEventsPerDay):
+        s = self.scale
+        left, top, right, bottom = box
+        cellWidth = right - left
+        drawBlack, drawRed = canvas
+        isOtherMonth = currDate.month != calDict['referenceDay'].month
+
+        # date, today gets the red circle
+        dateFont = self.get_font(32)
+        dateText = str(currDate.day)
+        dateWidth = dateFont.getlength(dateText)
+        if currDate == calDict['today']:
+            radius = 24 * s
+            centre = (left + cellWidth / 2, top + 4 * s + radius)
+            drawRed.ellipse([centre[0] - radius, centre[1] - radius, centre[0] + radius, centre[1] + radius], fill=0)
+            self.draw_text(canvas, (centre[0] - dateWidth / 2, centre[1] - dateFont.size / 2 - 4 * s), dateText,
+                           dateFont, 'white')
+            y = top + 8 * s + 2 * radius
+        else:
+            self.draw_text(canvas, (left + (cellWidth - dateWidth) / 2, top + 4 * s), dateText, dateFont,
+                           'muted' if isOtherMonth else 'black')
+            y = top + 8 * s + 48 * s
+
+        eventFont = self.get_font(16)
+        groupFont = self.get_font(16, bold=True)
+        lineHeight = 26 * s
+        textWidth = cellWidth - 4 * s
+
+        if eventCount <= maxEventsPerDay:
+            maxEvents = maxEventsPerDay
+        else:
+            maxEvents = maxEventsPerDay - 1
+
+        calGroup = ''
+        drawn = 0
+        for event in events[:maxEvents]:
+            # keep one line free for the "more" text if not everything fits into the cell
+            isNewGroup = weekCount < 3 and event.calendar != calGroup
+            linesNeeded = (2 if isNewGroup else 1) + (1 if drawn + 1 < eventCount else 0)
+            if y + linesNeeded * lineHeight > bottom:
+                break
+            if isNewGroup:
+                calGroup = event.calendar
+                self.draw_text(canvas, (left + 2 * s, y), self.fit_text(calGroup, groupFont, textWidth), groupFont,
+                               'black')
+                y += lineHeight + 2 * s
+
+            if event.isUpdated:
+                colour = 'red'
+            elif isOtherMonth:
+                colour = 'muted'
+            else:
+                colour = 'black'
+
+            x = left + 2 * s
+            markerSize = 10 * s
+            markerTop = y + (eventFont.size - markerSize) / 2 + 2 * s
+            summary = event.summary
+            if event.isMultiday:
+                if event.starts_on(currDate):
+                    self.draw_marker(canvas, x, markerTop, markerSize, 'right', colour)
+                elif event.ends_on(currDate):
+                    self.draw_marker(canvas, x, markerTop, markerSize, 'left', colour)
+                else:
+                    self.draw_marker(canvas, x, markerTop, markerSize, 'left', colour)
+                    x += markerSize + 1 * s
+                    self.draw_marker(canvas, x, markerTop, markerSize, 'right', colour)
+                x += markerSize + 3 * s
+            elif event.allday:
+                if summary[-14:] == 'hat Geburtstag':
+                    blackImage.paste(self.get_media('cake'), (int(x), int(y + 4 * s)))
+                    x += 20 * s
+                    summary = summary[:-15]
+            else:
+                summary = self.get_start_time(event, calDict['is24hour']) + ' ' + summary
+
+            self.draw_text(canvas, (x, y), self.fit_text(summary, eventFont, left + textWidth - x), eventFont, colour)
+            y += lineHeight
+            drawn += 1
+
+        if drawn < eventCount:
+            self.draw_text(canvas, (left + 2 * s, y), str(eventCount - drawn) + ' more', eventFont, 'muted')
+
+    def draw_day_tile(self, canvas, blackImage, redImage, box, tileBox, currDate, events, eventCount, calDict,
+                      weekCount, maxEventsPerDay):
+        # draws a day cell onto the page and returns it as a pair of tiles for the fragment cache
+        self.draw_day(canvas, blackImage, box, currDate, events, eventCount, calDict, weekCount, maxEventsPerDay)
+        return blackImage.crop(tileBox), redImage.crop(tileBox)
+
+    def render_frame(self, blackImage, redImage):
+        # reduce to the 1-bit planes the display expects and pack them in screen orientation, see render.channels
+        black = pack_plane(np.asarray(blackImage.convert('1'), dtype=bool), self.angle)
+        red = pack_plane(np.asarray(redImage, dtype=bool), self.angle)
+        self.bytesWritten = 0
+        if self.saveDebugImages:
+            Image.fromarray(unpack_plane(black)).save(self.workDir + '/black-channel.png')
+            Image.fromarray(unpack_plane(red)).save(self.workDir + '/red-channel.png')
+            self.bytesWritten = os.path.getsize(self.workDir + '/black-channel.png') + \
+                os.path.getsize(self.workDir + '/red-channel.png')
+        self.logger.info('Calendar drawn natively, {} bytes written to disk. Created black and red planes.'.format(
+            self.bytesWritten))
+        return black, red
+
+    def process_inputs(self, calDict):
+        # Same input as RenderHelper.process_inputs, draws the calendar directly instead of going through HTML
+        self.timings = {}
+        start = perf_counter()
+        weekCount = round(calDict['calRange'] / 7)
+        calList, dayCounts = self.get_cal_list(calDict, weekCount)
+        maxEventsPerDay = self.get_max_events_per_day(calDict['maxEventsPerDay'], weekCount)
+        battText = self.get_battery_text(calDict['batteryDisplayMode'], calDict['batteryLevel'])
+
+        blackImage = Image.new('L', (self.imageWidth, self.imageHeight), WHITE)
+        redImage = Image.new('1', (self.imageWidth, self.imageHeight), 1)
+        canvas = (ImageDraw.Draw(blackImage), ImageDraw.Draw(redImage))
+
+        top = self.draw_header(canvas, blackImage, calDict, battText)
+        top = self.draw_day_names(canvas, top, calDict['dayOfWeekText'], calDict['weekStartDay'])
+
+        s = self.scale
+        cellWidth = (self.imageWidth - 32 * s) / 7
+        rowHeight = (self.imageHeight - 16 * s - top) / weekCount
+        # day cells that did not change since the last render are pasted from the fragment cache
+        self.fragmentCache.begin()
+        for i in range(len(calList)):
+            currDate = calDict['calStartDate'] + timedelta(days=i)
+            left = 16 * s + (i % 7) * cellWidth
+            cellTop = top + (i // 7) * rowHeight
+            box = (left, cellTop, left + cellWidth, cellTop + rowHeight)
+            tileBox = tuple(int(v) for v in box)
+            style = (tileBox, maxEventsPerDay, calDict['is24hour'], currDate == calDict['today'],
+                     currDate.month != calDict['referenceDay'].month)
+            blackTile, redTile = self.fragmentCache.get_or_render(
+                day_key(currDate, calList[i], weekCount, style),
+                lambda: self.draw_day_tile(canvas, blackImage, redImage, box, tileBox, currDate, calList[i],
+                                           dayCounts[i], calDict, weekCount, maxEventsPerDay))
+            blackImage.paste(blackTile, tileBox[:2])
+            redImage.paste(redTile, tileBox[:2])
+        calDict['fragmentStats'] = self.fragmentCache.stats()
+        self.timings['rasterize'] = perf_counter() - start
+
+        start = perf_counter()
+        black, red = self.render_frame(blackImage, redImage)
+        self.timings['channels'] = perf_counter() - start
+        calDict['timings'] = self.timings
+        return black, red
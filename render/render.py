@@ -11,41 +11,88 @@ calendar and refreshing of the eInk display. In the future, I might choose to ge
 RPi device, while using a ESP32 or PiZero purely to just retrieve the image from a file host and update the screen.
 """
 
-from time import sleep
+from time import perf_counter
 from datetime import timedelta
+import datetime as dt
 import pathlib
 import logging
 import calendar
-from operator import itemgetter
-import imgkit
-import cv2
+from html import escape
+from string import Formatter
+from operator import attrgetter
 import numpy as np
-from PIL import Image
+from gcal.event import bucket_events
+from render.channels import BLACK_THRESHOLD, RED_LOWER, RED_UPPER, separate_channels, unpack_plane
+from render.fragments import FragmentCache, day_key
+
+
+# compiled templates by path, see load_template
+templates = {}
+
+# UTC offset of a timezone on a local day and the formatted start times, see RenderHelper.get_start_time
+dayOffsets = {}
+shortTimes = {}
+EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+def load_template(path):
+    # Reads a str.format style template once per process and splits it into (literal text, field name) pairs, so
+    # filling it is a single join without parsing the template again
+    if path not in templates:
+        with open(path, 'r') as file:
+            templates[path] = [(literal, field) for literal, field, spec, conversion in Formatter().parse(file.read())]
+    return templates[path]
+
+
+def day_utc_offset(tz, ordinal):
+    # Seconds east of UTC that hold for the whole local day, None on a day with a DST change. The offsets 14 hours
+    # before and after the day in UTC enclose the local day in every timezone
+    key = (tz, ordinal)
+    if key not in dayOffsets:
+        if len(dayOffsets) > 4096:
+            dayOffsets.clear()
+        dayStart = (ordinal - EPOCH_ORDINAL) * 86400
+        before = dt.datetime.fromtimestamp(dayStart - 14 * 3600, tz).utcoffset()
+        after = dt.datetime.fromtimestamp(dayStart + 38 * 3600, tz).utcoffset()
+        dayOffsets[key] = int(before.total_seconds()) if before == after else None
+    return dayOffsets[key]
+
+
+def fill_template(template, fields):
+    parts = []
+    for literal, field in template:
+        parts.append(literal)
+        if field is not None:
+            parts.append(str(fields[field]))
+    return ''.join(parts)
 
 
 class RenderHelper:
 
-    def __init__(self, width, height, angle):
+    def __init__(self, width, height, angle, saveDebugImages=False, fragmentCacheSize=256, workDir=None,
+                 blackThreshold=BLACK_THRESHOLD, blackDither=True, redLower=RED_LOWER, redUpper=RED_UPPER):
         self.logger = logging.getLogger('maginkcal')
         self.currPath = str(pathlib.Path(__file__).parent.absolute())
-        self.htmlFile = 'file://' + self.currPath + '/calendar.html'
+        # calendar.html and the debug images are written here, renders running at the same time need their own
+        self.workDir = workDir or self.currPath
+        # the stylesheets and media are resolved against the render folder wherever calendar.html is written to
+        self.baseHref = pathlib.Path(self.currPath).as_uri() + '/'
+        self.htmlFile = self.workDir + '/calendar.html'
         self.imageWidth = width
         self.imageHeight = height
-        if angle == 0:
-            self.rotate = False
-        elif angle == 90:
-            self.rotate = True
-            self.rotateAngle = cv2.ROTATE_90_CLOCKWISE
-        elif angle == 180:
-            self.rotate = True
-            self.rotateAngle = cv2.ROTATE_180
-        elif angle == 270:
-            self.rotate = True
-            self.rotateAngle = cv2.ROTATE_90_COUNTERCLOCKWISE
-
-
-    def render_image(self):
-        options = {
+        self.angle = angle  # clockwise rotation into screen orientation, 0, 90, 180 or 270
+        self.saveDebugImages = saveDebugImages  # write calendar.png and the extracted channels to the render folder
+        self.bytesWritten = 0  # bytes written to disk by the last render
+        self.fragmentCache = FragmentCache(fragmentCacheSize)  # rendered day cells, reused while a day is unchanged
+        self.timings = {}  # seconds per phase of the last render, handed back in calDict['timings']
+        # colour separation, see render.channels
+        self.blackThreshold = blackThreshold
+        self.blackDither = blackDither
+        self.redLower = redLower
+        self.redUpper = redUpper
+
+    def get_screenshot_options(self):
+        return {
             'format': 'png',
             'encoding': "UTF-8",
             'height': self.imageHeight,
@@ -53,40 +100,43 @@ class RenderHelper:
             'enable-local-file-access': None
         }
 
-        imgkit.from_file(self.currPath + '/calendar.html', self.currPath + '/calendar.png', options=options)
-
-        self.logger.info('Screenshot captured and saved to file.')
-
-        img = cv2.imread(self.currPath + '/calendar.png', cv2.IMREAD_UNCHANGED)  # get image
-
-        #mask
-        lower_red = np.array([0,0,128,255])
-        upper_red = np.array([128,128,255,255])
-        mask = cv2.inRange(img, lower_red, upper_red)
-
-        # set my output img to zero everywhere except my mask
-        redimg = img.copy()
-        redimg[np.where(mask==0)] = 255
-
-        blackimg = img[:,:,2]
-
-        if self.rotate:
-            redimg = cv2.rotate(redimg, self.rotateAngle)
-            blackimg = cv2.rotate(blackimg, self.rotateAngle)
-        #save channels for debugging
-        cv2.imwrite(self.currPath + '/red-channel.png',redimg) 
-        cv2.imwrite(self.currPath + '/black-channel.png',blackimg) 
-
-        blackimg = Image.open(self.currPath + '/black-channel.png')
-        redimg = Image.open(self.currPath + '/red-channel.png')	
-
-        self.logger.info('Image colours processed. Extracted grayscale and red images.')
-        return blackimg, redimg
-
-        
-    def get_day_in_cal(self, startDate, eventDate):
-        delta = eventDate - startDate
-        return delta.days
+    def render_image(self):
+        # only the HTML rendering needs wkhtmltoimage and OpenCV, the native one never imports them
+        import imgkit
+        start = perf_counter()
+        # with output_path False imgkit hands back the screenshot instead of writing calendar.png
+        screenshot = imgkit.from_file(self.htmlFile, False, options=self.get_screenshot_options())
+
+        self.logger.info('Screenshot captured.')
+        return self.process_screenshot(screenshot, start)
+
+    def process_screenshot(self, screenshot, start):
+        # PNG screenshot -> packed black and red planes, in memory unless saveDebugImages is set. start is the
+        # perf_counter before the screenshot was taken, see python -m render.renderbench for the file based flow
+        import cv2
+        img = cv2.imdecode(np.frombuffer(screenshot, dtype=np.uint8), cv2.IMREAD_UNCHANGED)  # get image
+        self.timings['rasterize'] = perf_counter() - start
+        channelStart = perf_counter()
+
+        # packed black and red planes in screen orientation, straight from the BGRA screenshot
+        black, red = separate_channels(img, self.angle, self.blackThreshold, self.redLower, self.redUpper,
+                                       self.blackDither)
+
+        if self.saveDebugImages:
+            self.save_debug_image('/calendar.png', screenshot)
+            #save channels for debugging
+            self.save_debug_image('/red-channel.png', cv2.imencode('.png', unpack_plane(red))[1].tobytes())
+            self.save_debug_image('/black-channel.png', cv2.imencode('.png', unpack_plane(black))[1].tobytes())
+        self.timings['channels'] = perf_counter() - channelStart
+
+        self.logger.info('Image colours processed in {:.3f}s, {} bytes written to disk. Extracted black and red '
+                         'planes.'.format(perf_counter() - start, self.bytesWritten))
+        return black, red
+
+    def save_debug_image(self, fileName, data):
+        with open(self.workDir + fileName, 'wb') as file:
+            file.write(data)
+        self.bytesWritten += len(data)
 
     def get_short_time(self, datetimeObj, is24hour=False):
         datetime_str = ''
@@ -106,49 +156,31 @@ class RenderHelper:
                 datetime_str = '{}{}am'.format(str(datetimeObj.hour), datetime_str)
         return datetime_str
 
-    def process_inputs(self, calDict):
-        # calDict = {'events': eventList, 'calStartDate': calStartDate, 'today': currDate, 'lastRefresh': currDatetime, 'batteryLevel': batteryLevel}
-        # first setup list to represent the 5 weeks in our calendar
-        calList = []
-        for i in range(calDict['calRange']):
-            calList.append([])
-
-        # retrieve calendar configuration
-        maxEventsPerDay = calDict['maxEventsPerDay']
-        batteryDisplayMode = calDict['batteryDisplayMode']
-        dayOfWeekText = calDict['dayOfWeekText']
-        weekStartDay = calDict['weekStartDay']
-        is24hour = calDict['is24hour']
-        
-        # set week count
-        weekCount = round(calDict['calRange'] / 7)
-
-        # for each item in the eventList, add them to the relevant day in our calendar list
-        for event in calDict['events']:
-            idx = self.get_day_in_cal(calDict['calStartDate'], event['startDatetime'].date())
-            if idx >= 0:
-                calList[idx].append(event)
-            if event['isMultiday']:
-                idxEnd = self.get_day_in_cal(calDict['calStartDate'], event['endDatetime'].date())
-                if idxEnd < len(calList):
-                    calList[idxEnd].append(event)
-                if weekCount == 1:
-                    for idxN in range(idx + 1 , idxEnd):
-                        if idxN < len(calList):
-                            calList[idxN].append(event)
-
-
-        # Read html template
-        with open(self.currPath + '/calendar_template.html', 'r') as file:
-            calendar_template = file.read()
-
-        # Insert month header
-        month_name = calendar.month_name[calDict['referenceDay'].month]
+    def get_start_time(self, event, is24hour):
+        # Same as get_short_time(event.startDatetime), the local time is computed from the UTC offset of the day,
+        # converting every event to a datetime with pytz took half of the HTML generation
+        offset = day_utc_offset(event.tz, event.startDay)
+        if offset is None:
+            return self.get_short_time(event.startDatetime, is24hour)
+        minutes = (event.start + offset) // 60 % 1440
+        key = (minutes, is24hour)
+        if key not in shortTimes:
+            shortTimes[key] = self.get_short_time(dt.time(minutes // 60, minutes % 60), is24hour)
+        return shortTimes[key]
+
+    def get_cal_list(self, calDict, weekCount):
+        # distribute the events over the days of the calendar, multiday events appear on every day they cover.
+        # Events may arrive in any order (e.g. streamed calendar by calendar), every day is sorted by time
+        calList, dayCounts = bucket_events(calDict['events'], calDict['calStartDate'], calDict['calRange'])
+
+        # group them by calendar in the week views
+        if weekCount < 3:
+            for day in calList:
+                day.sort(key=attrgetter('position'))
+        return calList, dayCounts
 
-        # Insert battery icon
+    def get_battery_text(self, batteryDisplayMode, battLevel):
         # batteryDisplayMode - 0: do not show / 1: always show / 2: show when battery is low
-        battLevel = calDict['batteryLevel']
-
         if batteryDisplayMode == 0:
             battText = 'batteryHide'
         elif batteryDisplayMode == 1:
@@ -167,14 +199,10 @@ class RenderHelper:
             battText = 'battery0'
         elif batteryDisplayMode == 2 and battLevel >= 20.0:
             battText = 'batteryHide'
+        return battText
 
-        # Populate the day of week row
-        cal_days_of_week = ''
-        for i in range(0, 7):
-            cal_days_of_week += '<li class="font-weight-bold text-uppercase">' + dayOfWeekText[
-                (i + weekStartDay) % 7] + "</li>\n"
-
-        # Populate the date and events
+    def get_max_events_per_day(self, maxEventsPerDay, weekCount):
+        # 0 means dynamic, depending on how many weeks have to fit on the screen
         if maxEventsPerDay == 0:
             if weekCount == 1:
                 maxEventsPerDay = 25
@@ -188,63 +216,115 @@ class RenderHelper:
                 maxEventsPerDay = 3
             if weekCount == 6:
                 maxEventsPerDay = 2
-        cal_events_text = ''
-        if weekCount < 3:
-            for i in range(len(calList)):
-                calList[i] = sorted(calList[i], key=lambda x: x['position'])
+        return maxEventsPerDay
+
+    def get_template(self):
+        # compiled once per process and shared by all helpers
+        return load_template(self.currPath + '/calendar_template.html')
+
+    def get_event_html(self, event, currDate, is24hour):
+        # summary of one event as shown in its day, with the multiday markers, birthday cake or start time
+        summary = escape(event.summary)
+        if event.isMultiday:
+            if event.starts_on(currDate):
+                return '►' + summary
+            elif event.ends_on(currDate):
+                return '◄' + summary
+            else:
+                return '◄►' + summary
+        elif event.allday:
+            if event.summary[-14:] == 'hat Geburtstag':
+                return '<img src="media/cake.png" /> ' + escape(event.summary[:-15])
+            else:
+                return summary
+        else:
+            return self.get_start_time(event, is24hour) + ' ' + summary
+
+    def get_day_html(self, currDate, events, eventCount, isToday, isOtherMonth, weekCount, maxEventsPerDay,
+                     is24hour):
+        # one day cell, the pieces are collected in a list and joined once
+        if isToday:
+            parts = ['<li><div class="datecircle">{}</div>\n'.format(currDate.day)]
+        elif isOtherMonth:
+            parts = ['<li><div class="date text-muted">{}</div>\n'.format(currDate.day)]
+        else:
+            parts = ['<li><div class="date">{}</div>\n'.format(currDate.day)]
+
+        if eventCount <= maxEventsPerDay:
+            maxEvents = maxEventsPerDay
+        else:
+            maxEvents = maxEventsPerDay - 1
+        calGroup = ''
+        for event in events[:maxEvents]:
+            if weekCount < 3 and event.calendar != calGroup:
+                calGroup = event.calendar
+                parts.append('<div class="group">' + escape(calGroup) + '</div>\n')
+            if event.isUpdated:
+                parts.append('<div class="event text-red">')
+            elif isOtherMonth:
+                parts.append('<div class="event text-muted">')
+            else:
+                parts.append('<div class="event">')
+            parts.append(self.get_event_html(event, currDate, is24hour))
+            parts.append('</div>\n')
+        if eventCount > maxEventsPerDay:
+            parts.append('<div class="event text-muted">{} more'.format(eventCount - maxEvents))
+
+        parts.append('</li>\n')
+        return ''.join(parts)
+
+    def build_html(self, calDict):
+        # calDict = {'events': eventList, 'calStartDate': calStartDate, 'today': currDate, 'lastRefresh': currDatetime, 'batteryLevel': batteryLevel}
+        # retrieve calendar configuration
+        maxEventsPerDay = calDict['maxEventsPerDay']
+        batteryDisplayMode = calDict['batteryDisplayMode']
+        dayOfWeekText = calDict['dayOfWeekText']
+        weekStartDay = calDict['weekStartDay']
+        is24hour = calDict['is24hour']
+
+        # set week count
+        weekCount = round(calDict['calRange'] / 7)
+
+        calList, dayCounts = self.get_cal_list(calDict, weekCount)
+
+        # Insert month header
+        month_name = calendar.month_name[calDict['referenceDay'].month]
+
+        # Insert battery icon
+        battText = self.get_battery_text(batteryDisplayMode, calDict['batteryLevel'])
+
+        # Populate the day of week row
+        cal_days_of_week = ''.join('<li class="font-weight-bold text-uppercase">' +
+                                   escape(dayOfWeekText[(i + weekStartDay) % 7]) + '</li>\n' for i in range(0, 7))
+
+        # Populate the date and events, days that did not change since the last render come from the fragment cache
+        maxEventsPerDay = self.get_max_events_per_day(maxEventsPerDay, weekCount)
+        self.fragmentCache.begin()
+        parts = []
         for i in range(len(calList)):
-            calGroup = ''
             currDate = calDict['calStartDate'] + timedelta(days=i)
-            dayOfMonth = currDate.day
-            if currDate == calDict['today']:
-                cal_events_text += '<li><div class="datecircle">' + str(dayOfMonth) + '</div>\n'
-            elif currDate.month != calDict['referenceDay'].month:
-                cal_events_text += '<li><div class="date text-muted">' + str(dayOfMonth) + '</div>\n'
-            else:
-                cal_events_text += '<li><div class="date">' + str(dayOfMonth) + '</div>\n'
-            
-            if len(calList[i]) <= maxEventsPerDay:
-                maxEvents = maxEventsPerDay
-            elif len(calList[i]) > maxEventsPerDay:
-                maxEvents = maxEventsPerDay - 1
-            for j in range(min(len(calList[i]), maxEvents)):
-                event = calList[i][j]
-                if weekCount < 3:
-                    if event['calendar'] != calGroup:
-                        calGroup = event['calendar']
-                        cal_events_text += '<div class="group">' + calGroup + '</div>\n'
-                cal_events_text += '<div class="event'
-                if event['isUpdated']:
-                    cal_events_text += ' text-red'
-                elif currDate.month != calDict['referenceDay'].month:
-                    cal_events_text += ' text-muted'
-                if event['isMultiday']:
-                    if event['startDatetime'].date() == currDate:
-                        cal_events_text += '">►' + event['summary']
-                    elif event['endDatetime'].date() == currDate:
-                        cal_events_text += '">◄' + event['summary']
-                    else:
-                        cal_events_text += '">◄►' + event['summary']
-                elif event['allday']:
-                    if event['summary'][-14:] == 'hat Geburtstag':
-                        cal_events_text += '"><img src="media/cake.png" /> ' + event['summary'][:-15]
-                    else:
-                        cal_events_text += '">' + event['summary']
-                else:
-                    cal_events_text += '">' + self.get_short_time(event['startDatetime'], is24hour) + ' ' + event[
-                        'summary']
-                cal_events_text += '</div>\n'
-            if len(calList[i]) > maxEventsPerDay:
-                cal_events_text += '<div class="event text-muted">' + str(len(calList[i]) - (maxEvents)) + ' more'
-
-            cal_events_text += '</li>\n'
-
-        # Append the bottom and write the file
-        htmlFile = open(self.currPath + '/calendar.html', "w")
-        htmlFile.write(calendar_template.format(month=month_name, battText=battText, dayOfWeek=cal_days_of_week, weeks=weekCount,
-                                                events=cal_events_text, time=calDict['time']))
-        htmlFile.close()
-
-        calBlackImage, calRedImage = self.render_image()
-
-        return calBlackImage, calRedImage
+            isToday = currDate == calDict['today']
+            isOtherMonth = currDate.month != calDict['referenceDay'].month
+            key = day_key(currDate, calList[i], weekCount, (maxEventsPerDay, is24hour, isToday, isOtherMonth))
+            parts.append(self.fragmentCache.get_or_render(key, lambda: self.get_day_html(
+                currDate, calList[i], dayCounts[i], isToday, isOtherMonth, weekCount, maxEventsPerDay, is24hour)))
+        calDict['fragmentStats'] = self.fragmentCache.stats()
+
+        return fill_template(self.get_template(), {'base': self.baseHref, 'month': month_name, 'battText': battText,
+                                                   'dayOfWeek': cal_days_of_week, 'weeks': weekCount,
+                                                   'events': ''.join(parts), 'time': calDict['time']})
+
+    def process_inputs(self, calDict):
+        # Append the bottom and write the file, wkhtmltoimage needs it on disk to resolve the stylesheets and media
+        self.timings = {}
+        start = perf_counter()
+        htmlText = self.build_html(calDict).encode('utf-8')
+        with open(self.htmlFile, "wb") as htmlFile:
+            htmlFile.write(htmlText)
+        self.bytesWritten = len(htmlText)
+        self.timings['html'] = perf_counter() - start
+
+        black, red = self.render_image()
+        calDict['timings'] = self.timings
+
+        return black, red
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the HTML render path from calendar.html to the packed black and red planes: the previous file based
+flow (wkhtmltoimage writes calendar.png, OpenCV reads it back and writes red-channel.png and black-channel.png,
+which PIL opens again for pack_image) against RenderHelper.process_screenshot, which keeps the screenshot and the
+planes in memory. Reports the best wall time and the bytes written to disk per render for both.
+The screenshot comes from wkhtmltoimage through imgkit when it is installed. Without it, or with --synthetic, a
+synthetic 1304x984 screenshot (render.channelbench) encoded once as PNG stands in for it, so the numbers cover the
+PNG and disk work around the screenshot but not wkhtmltoimage itself. Run it from the repository root with:
+python -m render.renderbench [--synthetic]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+from PIL import Image
+from display.epd12in48b import pack_image
+from render.channelbench import make_screenshot
+from render.channels import RED_LOWER, RED_UPPER
+from render.htmlbench import make_cal_dict
+from render.render import RenderHelper
+
+
+class ScreenshotSource:
+
+    def __init__(self, synthetic):
+        self.imgkit = None
+        self.png = None
+        if not synthetic:
+            try:
+                import imgkit
+                self.imgkit = imgkit
+            except ImportError:
+                pass
+        if self.imgkit is None:
+            self.png = cv2.imencode('.png', make_screenshot(1304, 984))[1].tobytes()
+
+    def take(self, helper, outputPath):
+        # Writes the screenshot to outputPath, or returns it when outputPath is False, like imgkit.from_file
+        if self.imgkit is not None:
+            return self.imgkit.from_file(helper.htmlFile, outputPath, options=helper.get_screenshot_options())
+        if outputPath is False:
+            return self.png
+        with open(outputPath, 'wb') as file:
+            file.write(self.png)
+        return True
+
+
+def write_html(helper, calDict):
+    with open(helper.htmlFile, 'wb') as file:
+        file.write(helper.build_html(calDict).encode('utf-8'))
+
+
+def render_files(helper, source, calDict):
+    # the render path as it was before, kept here for comparison only
+    write_html(helper, calDict)
+    source.take(helper, helper.workDir + '/calendar.png')
+    img = cv2.imread(helper.workDir + '/calendar.png', cv2.IMREAD_UNCHANGED)
+    mask = cv2.inRange(img, np.array(RED_LOWER), np.array(RED_UPPER))
+    redimg = img.copy()
+    redimg[mask==0] = 255
+    blackimg = img[:,:,2]
+    cv2.imwrite(helper.workDir + '/red-channel.png', redimg)
+    cv2.imwrite(helper.workDir + '/black-channel.png', blackimg)
+    black = pack_image(Image.open(helper.workDir + '/black-channel.png'))
+    red = pack_image(Image.open(helper.workDir + '/red-channel.png'))
+    return black, red
+
+
+def render_memory(helper, source, calDict):
+    write_html(helper, calDict)
+    start = time.perf_counter()
+    return helper.process_screenshot(source.take(helper, False), start)
+
+
+def measure(render, source, calDict, repeat=10):
+    # best wall time of repeat renders and the bytes one render leaves in its own work folder
+    with tempfile.TemporaryDirectory(prefix='maginkcal-renderbench-') as workDir:
+        helper = RenderHelper(1304, 984, 0, workDir=workDir)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            black, red = render(helper, source, calDict)
+            best = min(best, time.perf_counter() - start)
+        written = sum(entry.stat().st_size for entry in os.scandir(workDir))
+    return best, written, black, red
+
+
+if __name__ == '__main__':
+    source = ScreenshotSource('--synthetic' in sys.argv)
+    calDict = make_cal_dict()
+    print('screenshot: ' + ('wkhtmltoimage' if source.imgkit else 'synthetic PNG of {} bytes'.format(len(source.png))))
+    for name, render in (('files', render_files), ('memory', render_memory)):
+        seconds, written, black, red = measure(render, source, calDict)
+        assert black.shape == red.shape == (984, 1304 // 8), name
+        print('{:8s} {:8.2f} ms  {:9d} bytes written per render'.format(name, seconds * 1000, written))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Long-lived render worker. It owns a single render helper for the lifetime of the process, so the fonts, media, the
+HTML template and everything else the helper loads lazily stay warm between renders. Jobs are queued from any thread
+(main loop, button callbacks) and rendered one after the other on the worker thread.
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from time import perf_counter
+
+
+class RenderWorker:
+
+    def __init__(self, renderService):
+        self.logger = logging.getLogger('maginkcal')
+        self.renderService = renderService
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='render-worker', daemon=True)
+        self.thread.start()
+
+    def submit(self, calDict):
+        # Queue a render job, the returned future resolves to the packed (black, red) planes
+        future = Future()
+        self.jobs.put((calDict, future))
+        return future
+
+    def render(self, calDict):
+        # Blocking convenience wrapper around submit
+        return self.submit(calDict).result()
+
+    def stop(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            calDict, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = perf_counter()
+            try:
+                future.set_result(self.renderService.process_inputs(calDict))
+            except Exception as e:
+                future.set_exception(e)
+            self.logger.info('Render job finished in {:.3f}s ({} queued)'.format(perf_counter() - start,
+                                                                                self.jobs.qsize()))
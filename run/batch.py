@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch renderer for several displays driven from one render host. A display profile is config.json with some keys
+replaced, e.g. {"name": "kitchen", "calendars": [...], "defaultView": "month", "rotateAngle": 90}. The calendars of
+all profiles are fetched once, every calendar a single time over the days all pages need, then the pages are
+rendered in parallel in a process pool. Every render has its own scratch folder for calendar.html and the debug
+images, so renders running at the same time cannot overwrite each other's files.
+The output is one frame per profile in the quadrant ordered layout of display/framecodec.py, <name>.frame in the
+output folder, and frames.json with the ETag, page and next planned refresh of every frame, for a file host or thin
+display clients.
+Run it from the repository root with: python -m run.batch [profiles.json] [output folder]
+profiles.json holds a list of profiles, without it the "displayProfiles" of config.json are rendered.
+"""
+
+import datetime as dt
+import json
+import logging
+import os
+import pathlib
+import re
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from display.framecodec import frame_etag, pack_frame
+from run.lastgood import event_from_list, event_to_list
+from run.run import RunHelper
+
+# settings every profile render gets, the render host neither drives a panel nor knows the battery of a display
+BATCH_OVERRIDES = {'isDisplayToScreen': False, 'piSugar2Present': False, 'batteryDisplayMode': 0,
+                   'useEventStore': False, 'prefetchAdjacentPages': False, 'staleWhileRevalidate': False,
+                   'profileFile': None}
+
+
+def profile_name(profile, index):
+    # the name is used for the file names, everything but letters, digits, _ and - is replaced
+    return re.sub(r'[^\w-]', '_', str(profile.get('name', 'display{}'.format(index))))
+
+
+def load_profiles(config, profileList):
+    # name -> full config of every profile
+    profiles = {}
+    for i, profileConfig in enumerate(profileList):
+        name = profile_name(profileConfig, i)
+        if name in profiles:
+            raise ValueError('Display profile {} is defined twice'.format(name))
+        profile = dict(config)
+        profile.update(profileConfig)
+        profile.update(BATCH_OVERRIDES)
+        profiles[name] = profile
+    return profiles
+
+
+def page_range(run, calRange):
+    startDatetime = run.displayTZ.localize(dt.datetime.combine(calRange['StartDate'], dt.time.min))
+    endDatetime = run.displayTZ.localize(dt.datetime.combine(calRange['EndDate'], dt.time.max))
+    return startDatetime, endDatetime
+
+
+def fetch_events(base, pages):
+    # Fetches the calendars of all pages once and returns name -> events of every page, as lists for the worker
+    # processes. Pages are grouped by display timezone, the days of all-day events depend on it
+    from gcal.gcal import GcalHelper
+    gcalService = GcalHelper(base.eventStore, base.maxParallelFetches, base.fetchTimeout)
+    groups = {}
+    for name, (run, date, calRange) in pages.items():
+        groups.setdefault(run.displayTZ.zone, []).append(name)
+    events = {}
+    for names in groups.values():
+        runs = [pages[name][0] for name in names]
+        ranges = [page_range(pages[name][0], pages[name][2]) for name in names]
+        calendarIds = list(dict.fromkeys(cal['id'] for run in runs for cal in run.calendars))
+        # the events come back with the calendar id in place of the name, the profiles name the calendars themselves
+        shared = gcalService.retrieve_events([{'id': calendarId, 'name': calendarId, 'position': 0}
+                                              for calendarId in calendarIds],
+                                             min(start for start, end in ranges), max(end for start, end in ranges),
+                                             runs[0].displayTZ, base.thresholdHours)
+        for name, run, (start, end) in zip(names, runs, ranges):
+            calendars = {cal['id']: cal for cal in run.calendars}
+            minTimestamp = start.timestamp()
+            maxTimestamp = end.timestamp()
+            pageEvents = []
+            for event in shared:
+                cal = calendars.get(event.calendar)
+                if cal is None or event.end < minTimestamp or event.start > maxTimestamp:
+                    continue
+                values = event_to_list(event)
+                values[1:3] = cal['name'], cal['position']
+                pageEvents.append(values)
+            events[name] = pageEvents
+    return events
+
+
+def render_profile(profile, date, calRange, events, workDir):
+    # Runs in a pool process: renders the page of one profile in its own scratch folder and returns the frame
+    start = perf_counter()
+    os.makedirs(workDir, exist_ok=True)
+    run = RunHelper(dict(profile, renderWorkDir=workDir))
+    now = dt.datetime.now(run.displayTZ)
+    eventList = [event_from_list(values, run.displayTZ, run.thresholdHours, now.timestamp()) for values in events]
+    try:
+        frame = run.render_page(date, profile['defaultView'], calRange, now, 100, eventList)
+    finally:
+        if run.renderWorker is not None:
+            run.renderWorker.stop()
+    nextRefresh = frame['nextRefresh'][0].isoformat() if frame['nextRefresh'] else None
+    return pack_frame(frame['black'], frame['red']), nextRefresh, perf_counter() - start
+
+
+def write_file(path, data):
+    # through a temporary file, a client or file host never reads a half written frame
+    tmpPath = path + '.tmp'
+    with open(tmpPath, 'wb') as file:
+        file.write(data)
+    os.replace(tmpPath, path)
+
+
+def render_batch(config, profileList, outputDir, workers=None):
+    # Renders one frame per profile into outputDir, returns the manifest and the names of the failed profiles.
+    # The manifest entries of failed profiles stay as they were, so their last frame is still served
+    logger = logging.getLogger('maginkcal')
+    profiles = load_profiles(config, profileList)
+    base = RunHelper(dict(config, isDisplayToScreen=False, prefetchAdjacentPages=False, profileFile=None))
+    pages = {}
+    failed = []
+    for name, profile in profiles.items():
+        run = RunHelper(profile)
+        date = dt.datetime.now(run.displayTZ).date()
+        calRange = run.get_cal_range(date, profile['defaultView'], 'default')
+        if calRange is None:
+            logger.error('Display profile {} has an unknown view {}'.format(name, profile['defaultView']))
+            failed.append(name)
+            continue
+        pages[name] = (run, date, calRange)
+
+    start = perf_counter()
+    events = fetch_events(base, pages)
+    logger.info('Calendars of {} profiles retrieved in {:.3f}s'.format(len(profiles), perf_counter() - start))
+
+    os.makedirs(outputDir, exist_ok=True)
+    manifestPath = os.path.join(outputDir, 'frames.json')
+    manifest = {}
+    if os.path.exists(manifestPath):
+        with open(manifestPath) as file:
+            manifest = json.load(file)
+    start = perf_counter()
+    with tempfile.TemporaryDirectory(prefix='maginkcal-batch-') as scratch, \
+            ProcessPoolExecutor(workers or config.get('batchWorkers')) as executor:
+        futures = {name: executor.submit(render_profile, profiles[name], date, calRange, events[name],
+                                         os.path.join(scratch, name))
+                   for name, (run, date, calRange) in pages.items()}
+        for name, future in futures.items():
+            try:
+                frame, nextRefresh, seconds = future.result()
+            except Exception:
+                logger.exception('Display profile {} could not be rendered'.format(name))
+                failed.append(name)
+                continue
+            write_file(os.path.join(outputDir, name + '.frame'), frame)
+            run, date, calRange = pages[name]
+            manifest[name] = {'file': name + '.frame', 'etag': frame_etag(frame), 'view': profiles[name]['defaultView'],
+                              'startDate': calRange['StartDate'].isoformat(), 'events': len(events[name]),
+                              'rendered': dt.datetime.now(run.displayTZ).isoformat(), 'nextRefresh': nextRefresh}
+            logger.info('Display profile {} rendered in {:.3f}s'.format(name, seconds))
+    logger.info('{} of {} profiles rendered in {:.3f}s'.format(len(profiles) - len(failed), len(profiles),
+                                                               perf_counter() - start))
+    write_file(manifestPath, json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest, failed
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s %(levelname)s - %(message)s')
+    logging.getLogger('maginkcal').setLevel(logging.INFO)
+    with open('config.json') as file:
+        config = json.load(file)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as file:
+            profileList = json.load(file)
+    else:
+        profileList = config.get('displayProfiles') or []
+    if not profileList:
+        sys.exit('No display profiles, pass a profiles file or set "displayProfiles" in config.json')
+    outputDir = sys.argv[2] if len(sys.argv) > 2 else \
+        str(pathlib.Path(__file__).parent.parent.absolute() / config.get('batchOutputDir', 'frames'))
+    manifest, failed = render_batch(config, profileList, outputDir)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fake clock for the refresh scheduler. Waiting advances the fake time instantly, so days of scheduling can be checked
+in milliseconds without a display or a calendar account. Run this file to go through a few scenarios: hourly
+refreshes, quiet hours, a DST change, a slow job and refreshes planned from the events.
+"""
+
+import datetime as dt
+
+
+class FakeClock:
+
+    def __init__(self, tz, start):
+        # start is a naive local datetime in the pytz timezone tz
+        self.tz = tz
+        self.time = tz.localize(start)
+        self.waits = []
+
+    def now(self):
+        return self.time
+
+    def wait(self, seconds, stopEvent):
+        self.waits.append(seconds)
+        self.time = self.tz.normalize(self.time + dt.timedelta(seconds=seconds))
+        return stopEvent.is_set()
+
+    def advance(self, seconds):
+        self.time = self.tz.normalize(self.time + dt.timedelta(seconds=seconds))
+
+
+if __name__ == '__main__':
+    import pytz
+    from gcal.event import Event
+    from run.scheduler import Scheduler, plan_next_refresh
+
+    tz = pytz.timezone('Europe/Zurich')
+
+    def run_until(scheduler, clock, end, jobSeconds=0):
+        # runs the scheduler until the fake time reaches end, returns the local times the job was started at
+        runs = []
+
+        def job(now):
+            runs.append(now.strftime('%m-%d %H:%M'))
+            clock.advance(jobSeconds)
+            if clock.now() >= end:
+                scheduler.stop()
+        scheduler.run_forever(job)
+        return runs
+
+    # hourly refreshes at the full hour, like the old busy loop but exactly once per hour
+    clock = FakeClock(tz, dt.datetime(2026, 10, 18, 9, 59, 30))
+    runs = run_until(Scheduler(clock, 60), clock, tz.localize(dt.datetime(2026, 10, 18, 13, 0)), jobSeconds=40)
+    assert runs == ['10-18 10:00', '10-18 11:00', '10-18 12:00', '10-18 13:00'], runs
+    assert max(clock.waits) <= 300
+    print('hourly:', runs)
+
+    # quiet hours from 23:00 until 06:00, the first refresh after them is at 06:00
+    clock = FakeClock(tz, dt.datetime(2026, 10, 18, 21, 10))
+    runs = run_until(Scheduler(clock, 60, [23, 6]), clock, tz.localize(dt.datetime(2026, 10, 19, 7, 0)))
+    assert runs == ['10-18 22:00', '10-19 06:00', '10-19 07:00'], runs
+    print('quiet hours:', runs)
+
+    # 90 minute interval counted from midnight, across the end of DST on 25 October
+    clock = FakeClock(tz, dt.datetime(2026, 10, 25, 0, 10))
+    runs = run_until(Scheduler(clock, 90), clock, tz.localize(dt.datetime(2026, 10, 25, 6, 0)))
+    assert runs == ['10-25 01:30', '10-25 03:00', '10-25 04:30', '10-25 06:00'], runs
+    print('DST change:', runs)
+
+    # a job running past the next deadline does not cause a burst of catch-up refreshes
+    clock = FakeClock(tz, dt.datetime(2026, 10, 18, 9, 30))
+    runs = run_until(Scheduler(clock, 15), clock, tz.localize(dt.datetime(2026, 10, 18, 11, 0)), jobSeconds=20 * 60)
+    assert runs == ['10-18 09:45', '10-18 10:15', '10-18 10:45'], runs
+    print('slow job:', runs)
+
+    # smart mode: the highlight of an event updated at 9:00 ends at 11:00, then the calendar is polled every 3 hours
+    # until midnight moves the date circle
+    updated = tz.localize(dt.datetime(2026, 10, 18, 9, 0))
+    events = [Event('Dentist', 'Family', 0, updated + dt.timedelta(days=1), updated + dt.timedelta(days=1, hours=1),
+                    updated, False, True)]
+    clock = FakeClock(tz, dt.datetime(2026, 10, 18, 10, 0))
+    plan = [plan_next_refresh(events, clock.now(), tz, 2, 180)]
+    scheduler = Scheduler(clock, 60, None, lambda: plan[0])
+    reasons = []
+
+    def smart_job(now):
+        reasons.append((now.strftime('%m-%d %H:%M'), plan[0][1]))
+        # after the refresh the event is no longer recently updated
+        events[0].isUpdated = False
+        plan[0] = plan_next_refresh(events, now, tz, 2, 180)
+        if now >= tz.localize(dt.datetime(2026, 10, 19, 0, 0)):
+            scheduler.stop()
+    scheduler.run_forever(smart_job)
+    assert reasons == [('10-18 11:00', 'highlight of "Dentist" expires'), ('10-18 14:00', 'polling for new events'),
+                       ('10-18 17:00', 'polling for new events'), ('10-18 20:00', 'polling for new events'),
+                       ('10-18 23:00', 'polling for new events'), ('10-19 00:00', 'day rollover')], reasons
+    print('smart:', reasons)
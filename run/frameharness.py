@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local harness for the frame server and the thin display client, both sides on one machine. The server side renders
+pages of synthetic events with the pil backend through RunHelper and publishes them on a free port of 127.0.0.1,
+the client side runs in a separate interpreter like on a display device, with display.epdmock in place of the SPI
+bus. Checks that the client pushes exactly the quadrant slices the server rendered, gets a 304 while the frame is
+unchanged, that an unchanged page is skipped like on a local display and not published again, that a new frame is
+the next version, and that the client imports no render or image modules.
+Run it from the repository root with: python -m run.frameharness
+"""
+
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+# modules a thin client must not need
+HEAVY_MODULES = ('numpy', 'PIL', 'cv2', 'imgkit', 'render', 'gcal', 'googleapiclient', 'pytz')
+
+
+def digest(data):
+    return hashlib.sha1(bytes(data)).hexdigest()
+
+
+def child(url, etag):
+    # one wake cycle of a display client, prints the results as JSON
+    start = time.perf_counter()
+    from display.display import DisplayHelper
+    from display.epd12in48b import EPD_WIDTH, EPD_HEIGHT, QUADRANTS
+    from display.epdmock import MockEPDConfig
+    from display.frameclient import FrameClient
+    mock = MockEPDConfig()
+    displayService = DisplayHelper(EPD_WIDTH, EPD_HEIGHT, backend=mock)
+    client = FrameClient(url)
+    client.etag = etag or None
+    changed = displayService.update_from_server(client)
+    slices = {}
+    if changed:
+        for name, *_ in QUADRANTS:
+            slices[name] = [digest(mock.data_for(name, 0x10)), digest(mock.data_for(name, 0x13))]
+    heavy = sorted({name.split('.')[0] for name in sys.modules if name.split('.')[0] in HEAVY_MODULES})
+    print(json.dumps({'changed': changed, 'version': client.version, 'etag': client.etag, 'received': client.received,
+                      'slices': slices, 'heavy': heavy, 'seconds': time.perf_counter() - start}))
+
+
+def spawn(url, etag=None):
+    output = subprocess.run([sys.executable, '-m', 'run.frameharness', '--client', url, etag or ''], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def make_events(run, today, count):
+    import datetime as dt
+    from gcal.event import Event
+    events = []
+    for i in range(count):
+        start = run.displayTZ.localize(dt.datetime.combine(today + dt.timedelta(days=i // 3), dt.time(8 + 3 * (i % 3))))
+        events.append(Event('Event {}'.format(i), 'Harness', 1, start, start + dt.timedelta(hours=1),
+                            start - dt.timedelta(days=2), False, False))
+    return events
+
+
+def publish_page(run, view, events, now):
+    from run.profiler import Profiler
+    calRange = run.get_cal_range(now.date(), view, 'default')
+    frame = run.render_page(now.date(), view, calRange, now, 100, events)
+    run.show_frame(frame, now.date(), Profiler())
+
+
+def check_slices(server, result):
+    from display.framecodec import split_frame
+    expected = {name: [digest(black), digest(red)] for name, black, red in split_frame(server.frame)}
+    assert result['slices'] == expected, 'client pushed other data than the server rendered'
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--client']:
+        child(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    import datetime as dt
+    from display.framecodec import ENCODINGS
+    from display.framediff import FrameStore
+    from run.frameserver import FrameServer
+    from run.run import RunHelper
+    with open('config.json') as file:
+        config = json.load(file)
+    config.update({'renderBackend': 'pil', 'piSugar2Present': False, 'isDisplayToScreen': False,
+                   'useEventStore': False, 'prefetchAdjacentPages': False, 'staleWhileRevalidate': False,
+                   'profileFile': None})
+    run = RunHelper(config)
+    # the last published frame goes to a scratch file instead of display/lastframe.npz
+    scratch = tempfile.TemporaryDirectory(prefix='maginkcal-harness-')
+    run.frameStore = FrameStore(scratch.name + '/lastframe.npz', run.timestampRegion)
+    run.frameServer = FrameServer('127.0.0.1', 0)
+    run.frameServer.start()
+    url = 'http://127.0.0.1:{}/frame'.format(run.frameServer.port)
+    now = dt.datetime.now(run.displayTZ)
+    today = now.date()
+    try:
+        publish_page(run, config['defaultView'], make_events(run, today, 12), now)
+        first = spawn(url)
+        assert first['changed'] and first['version'] == 1, first
+        check_slices(run.frameServer, first)
+        assert not first['heavy'], 'client imported ' + ', '.join(first['heavy'])
+        print('version 1: client pushed the rendered slices in {:.2f}s, {} bytes received'.format(
+            first['seconds'], first['received']))
+
+        again = spawn(url, first['etag'])
+        assert not again['changed'] and again['version'] == 1 and again['received'] == 0, again
+        print('unchanged frame: 304, nothing pushed')
+
+        # the same page again is skipped like on a local display, the clients keep their version
+        publish_page(run, config['defaultView'], make_events(run, today, 12), now)
+        assert run.frameServer.version == 1, run.frameServer.version
+        print('unchanged page: not published again')
+
+        publish_page(run, config['defaultView'], make_events(run, today, 13), now)
+        second = spawn(url, first['etag'])
+        assert second['changed'] and second['version'] == 2 and second['etag'] != first['etag'], second
+        check_slices(run.frameServer, second)
+        print('version 2: client pushed the new slices, {} bytes received'.format(second['received']))
+
+        sizes = ', '.join('{} {} bytes'.format(encoding, len(run.frameServer.get(encoding)[3]))
+                          for encoding in ENCODINGS)
+        print('frame sizes: ' + sizes)
+        print('client modules: none of ' + ', '.join(HEAVY_MODULES))
+    finally:
+        run.frameServer.stop()
+        scratch.cleanup()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Render once, serve many: the render host publishes every frame it shows here and thin display clients (a Pi Zero
+running display/frameclient.py, or an ESP32) download it over HTTP and only push it to the panel. The frame is
+served at /frame in the quadrant ordered layout of display/framecodec.py, deflate or PackBits encoded as the client
+asks for in Accept-Encoding.
+Every response carries the ETag of the frame (a hash of its content), the X-Frame-Version counter that goes up
+whenever the frame changes and X-Next-Refresh, the time the render host plans to update the frame next. A client
+sends the ETag it has in If-None-Match and gets a bodyless 304 while the frame is unchanged.
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from display.framecodec import FRAME_SIZE, choose_encoding, encode, frame_etag, pack_frame
+
+FRAME_PATH = '/frame'
+
+
+class FrameRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != FRAME_PATH:
+            self.send_error(404)
+            return
+        encoding = choose_encoding(self.headers.get('Accept-Encoding'))
+        current = self.server.frameServer.get(encoding)
+        if current is None:
+            # nothing rendered yet
+            self.send_response(503)
+            self.send_header('Retry-After', '60')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        version, etag, nextRefresh, data = current
+        notModified = self.headers.get('If-None-Match') == etag
+        self.send_response(304 if notModified else 200)
+        self.send_header('ETag', etag)
+        self.send_header('X-Frame-Version', str(version))
+        self.send_header('X-Frame-Layout', 'quadrants;size={}'.format(FRAME_SIZE))
+        if nextRefresh is not None:
+            self.send_header('X-Next-Refresh', nextRefresh.isoformat())
+        self.send_header('Cache-Control', 'no-cache')
+        if notModified:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', 'application/octet-stream')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        self.server.frameServer.logger.debug('Frame server: ' + format % args)
+
+
+class FrameServer:
+
+    def __init__(self, host='', port=8080):
+        self.logger = logging.getLogger('maginkcal')
+        self.lock = threading.Lock()
+        self.frame = None  # current frame, quadrant ordered
+        self.etag = None
+        self.version = 0
+        self.nextRefresh = None
+        self.encoded = {}  # encoding -> encoded current frame, filled on the first request for it
+        self.httpd = ThreadingHTTPServer((host, port), FrameRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.frameServer = self
+        self.port = self.httpd.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='frame-server', daemon=True)
+        self.thread.start()
+        self.logger.info('Serving frames on port {}'.format(self.port))
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def set_next_refresh(self, nextRefresh):
+        # Called after every update, also when the frame is not published again
+        with self.lock:
+            self.nextRefresh = nextRefresh
+
+    def publish(self, black, red):
+        # Called with the packed planes of every frame that is shown, returns whether the frame changed
+        frame = pack_frame(black, red)
+        etag = frame_etag(frame)
+        with self.lock:
+            if etag == self.etag:
+                return False
+            self.frame = frame
+            self.etag = etag
+            self.version += 1
+            self.encoded = {}
+            version = self.version
+        self.logger.info('Published frame version {}'.format(version))
+        return True
+
+    def get(self, encoding):
+        # (version, etag, next refresh, encoded frame) or None before the first frame
+        with self.lock:
+            if self.frame is None:
+                return None
+            if encoding not in self.encoded:
+                self.encoded[encoding] = encode(self.frame, encoding)
+            return self.version, self.etag, self.nextRefresh, self.encoded[encoding]
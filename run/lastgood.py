@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Last successfully fetched events and rendered frame of the most recently shown pages, kept on disk for the
+"staleWhileRevalidate" mode. When the calendar cannot be reached the display keeps (or goes back to) the last good
+frame of a page, and a button press can show it right away while fresh data is fetched in the background.
+All pages are stored together in one compressed npz file: the packed planes as arrays and the events and metadata
+as a JSON document.
+"""
+
+import datetime as dt
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from gcal.event import Event
+
+
+def event_to_list(event):
+    return [event.summary, event.calendar, event.position, event.start, event.end, event.updated, event.allday]
+
+
+def event_from_list(values, tz, thresholdHours, now):
+    # the highlight of recently updated events is decided again, the stored events may be hours old
+    summary, calendar, position, start, end, updated, allday = values
+    return Event(summary, calendar, position, dt.datetime.fromtimestamp(start, tz), dt.datetime.fromtimestamp(end, tz),
+                 dt.datetime.fromtimestamp(updated, tz), allday, now - updated < thresholdHours * 3600)
+
+
+class LastGoodStore:
+
+    def __init__(self, path, tz, maxPages=8):
+        self.logger = logging.getLogger('maginkcal')
+        self.path = path
+        self.tz = tz
+        self.maxPages = maxPages
+        self.pages = None  # (view, start date) -> page, loaded on first use
+        self.lock = threading.Lock()
+
+    def load(self):
+        self.pages = OrderedDict()
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                for i, page in enumerate(json.loads(data['index'].tobytes().decode('utf-8'))):
+                    page['black'] = data['black{}'.format(i)]
+                    page['red'] = data['red{}'.format(i)]
+                    self.pages[(page['view'], page['startDate'])] = page
+        except (OSError, ValueError, KeyError):
+            self.logger.info('Last good frames could not be read, starting without them')
+            self.pages = OrderedDict()
+
+    def save(self):
+        arrays = {}
+        index = []
+        for i, page in enumerate(self.pages.values()):
+            arrays['black{}'.format(i)] = page['black']
+            arrays['red{}'.format(i)] = page['red']
+            index.append({key: value for key, value in page.items() if key not in ('black', 'red')})
+        arrays['index'] = np.frombuffer(json.dumps(index).encode('utf-8'), dtype=np.uint8)
+        # write to a temporary file first so an interrupted run never leaves a truncated file behind
+        tmpPath = self.path + '.tmp.npz'
+        np.savez_compressed(tmpPath, **arrays)
+        os.replace(tmpPath, self.path)
+
+    def put(self, view, calRange, today, events, black, red, fetched):
+        # stores the page built from freshly fetched events, the oldest page is dropped beyond maxPages
+        page = {'view': view, 'startDate': calRange['StartDate'].isoformat(),
+                'endDate': calRange['EndDate'].isoformat(), 'range': calRange['Range'], 'today': today.isoformat(),
+                'fetched': fetched.isoformat(), 'events': [event_to_list(event) for event in events],
+                'black': black, 'red': red}
+        with self.lock:
+            if self.pages is None:
+                self.load()
+            key = (view, page['startDate'])
+            self.pages[key] = page
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.maxPages:
+                self.pages.popitem(last=False)
+            self.save()
+
+    def get(self, view, startDate):
+        # Returns the stored page or None. The page has black, red, today and fetched (dates and datetimes) and the
+        # events as stored, see get_events
+        with self.lock:
+            if self.pages is None:
+                self.load()
+            page = self.pages.get((view, startDate.isoformat()))
+        if page is None:
+            return None
+        return dict(page, today=dt.date.fromisoformat(page['today']),
+                    fetched=dt.datetime.fromisoformat(page['fetched']).astimezone(self.tz))
+
+    def get_events(self, page, thresholdHours, now):
+        return [event_from_list(values, self.tz, thresholdHours, now.timestamp()) for values in page['events']]
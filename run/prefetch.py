@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prerendering of the pages reachable with a single button press. After every display update the previous and next
+page of the current view and the other views of the view button's cycle are rendered and packed in the background,
+so a button press can go straight to the SPI upload.
+"""
+
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+
+    def __init__(self, maxSize=8):
+        # small LRU cache of packed frames keyed by (view, start date, data version)
+        self.maxSize = maxSize
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.frames
+
+    def get(self, key):
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key, frame):
+        with self.lock:
+            self.frames[key] = frame
+            self.frames.move_to_end(key)
+            while len(self.frames) > self.maxSize:
+                self.frames.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+
+
+class Prefetcher:
+
+    def __init__(self, run):
+        self.logger = logging.getLogger('maginkcal')
+        self.run = run
+        self.pages = queue.Queue()
+        self.generation = 0
+        self.thread = threading.Thread(target=self.work, name='prefetcher', daemon=True)
+        self.thread.start()
+
+    def get_adjacent_pages(self, date, view):
+        # the pages the previous, next and view buttons lead to
+        nextView = self.run.get_next_view(view)
+        return [
+            (self.run.get_adjacent_date(date, view, 1), view),
+            (self.run.get_adjacent_date(date, view, -1), view),
+            (date, nextView),
+            (date, self.run.get_next_view(nextView)),
+        ]
+
+    def schedule(self, date, view, dataVersion):
+        # Pages scheduled earlier and not rendered yet are dropped, they belong to a page that is no longer shown
+        self.generation += 1
+        for page in self.get_adjacent_pages(date, view):
+            self.pages.put((self.generation, page, dataVersion))
+
+    def work(self):
+        while True:
+            generation, (date, view), dataVersion = self.pages.get()
+            if generation != self.generation:
+                continue
+            try:
+                self.run.prefetch_page(date, view, dataVersion)
+            except Exception as e:
+                self.logger.error('Prerendering {} page for {} failed: {}'.format(view, date, e))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phase profiler for the time from boot to a refreshed display. Every update records how long the phases took (imports,
+config, OAuth, each calendar fetch, HTML, rasterisation, channel extraction, packing, SPI upload, busy-wait) together
+with the battery level before and after, and appends the result as one JSON line to the profile file. ImportTimer
+reports where the import time went, per top-level package.
+Run this file to aggregate the recorded history: python -m run.profiler [profile.jsonl]
+"""
+
+import builtins
+import datetime as dt
+import json
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# measured in maginkcal.py before RunHelper and its profiler exist
+STARTUP_PHASES = ('imports', 'config', 'init')
+
+# the ImportTimer installed by maginkcal.py, see install_import_timer
+importTimer = None
+
+
+def install_import_timer():
+    global importTimer
+    if importTimer is None:
+        importTimer = ImportTimer()
+        importTimer.install()
+    return importTimer
+
+
+def take_import_times():
+    # seconds per package imported since the last call, empty without an installed ImportTimer
+    return importTimer.take() if importTimer is not None else {}
+
+
+class ImportTimer:
+    # Times the first import of every module by wrapping builtins.__import__, like python -X importtime but summed up
+    # per top-level package. Time spent in nested imports is counted for the package that was imported, not for the
+    # one importing it
+
+    def __init__(self):
+        self.times = {}  # top-level package -> seconds since the last take()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.original = None
+
+    def install(self):
+        self.original = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def uninstall(self):
+        builtins.__import__ = self.original
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # modules that are already loaded and relative imports go straight through
+        if level or name in sys.modules:
+            return self.original(name, globals, locals, fromlist, level)
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # seconds spent in nested imports
+        start = perf_counter()
+        try:
+            return self.original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            package = name.partition('.')[0]
+            with self.lock:
+                self.times[package] = self.times.get(package, 0.0) + elapsed - nested
+
+    def take(self):
+        # returns the seconds per package imported since the last call
+        with self.lock:
+            times, self.times = self.times, {}
+        return times
+
+
+def compact_import_times(times, minSeconds=0.005):
+    # keeps the profile record small, packages below minSeconds are summed up as "other"
+    compact = {package: round(seconds, 4) for package, seconds in times.items() if seconds >= minSeconds}
+    other = sum(seconds for seconds in times.values() if seconds < minSeconds)
+    if other:
+        compact['other'] = round(other, 4)
+    return compact
+
+
+def import_summary(times, top=6):
+    # e.g. "1.842s: googleapiclient 0.711s, cv2 0.402s, ... and 23 others 0.058s"
+    ranked = sorted(times.items(), key=lambda item: -item[1])
+    parts = ['{} {:.3f}s'.format(package, seconds) for package, seconds in ranked[:top]]
+    if len(ranked) > top:
+        parts.append('and {} others {:.3f}s'.format(len(ranked) - top, sum(seconds for _, seconds in ranked[top:])))
+    return '{:.3f}s: {}'.format(sum(times.values()), ', '.join(parts))
+
+
+class Profiler:
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.phases = {}
+        self.values = {}
+        self.marks = {}  # perf_counter timestamps of single moments, e.g. the first calendar request
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - start)
+
+    def add(self, name, seconds):
+        # phases recorded more than once in a run (e.g. two display refreshes) are summed up
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def update(self, phases):
+        for name, seconds in phases.items():
+            self.add(name, seconds)
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def mark(self, name, timestamp):
+        # only the first occurrence counts
+        self.marks.setdefault(name, timestamp)
+
+    def to_record(self):
+        # phases before the profiler was created are added to the total
+        before = sum(seconds for name, seconds in self.phases.items() if name in STARTUP_PHASES)
+        record = {'time': dt.datetime.now().astimezone().isoformat(timespec='seconds'),
+                  'total': round(perf_counter() - self.start + before, 4),
+                  'phases': {name: round(seconds, 4) for name, seconds in self.phases.items()},
+                  # seconds from the start of the run, which is the start of the process for the first update
+                  'marks': {name: round(timestamp - self.start + before, 4) for name, timestamp in self.marks.items()}}
+        record.update(self.values)
+        return record
+
+    def write(self, path):
+        record = self.to_record()
+        with open(path, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+        return record
+
+
+def load_records(path):
+    records = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def report(records):
+    # Aggregates the runs per phase, fetches of single calendars are summed up into "fetch"
+    lines = ['{} runs from {} to {}'.format(len(records), records[0]['time'], records[-1]['time'])]
+    columns = '{:24s} {:>5s} {:>8s} {:>8s} {:>8s} {:>8s}'
+    lines.append(columns.format('phase', 'runs', 'mean', 'median', 'p90', 'max'))
+    phases = {}
+    for record in records:
+        phases.setdefault('total', []).append(record['total'])
+        for name, seconds in record['phases'].items():
+            phases.setdefault(name, []).append(seconds)
+        for name, seconds in record.get('marks', {}).items():
+            phases.setdefault('until ' + name, []).append(seconds)
+        fetches = [seconds for name, seconds in record['phases'].items() if name.startswith('fetch ')]
+        if fetches:
+            phases.setdefault('fetch', []).append(sum(fetches))
+    for name, values in sorted(phases.items(), key=lambda item: -sum(item[1]) / len(item[1])):
+        lines.append(columns.format(name, str(len(values)), '{:.3f}'.format(sum(values) / len(values)),
+                                    '{:.3f}'.format(percentile(values, 0.5)), '{:.3f}'.format(percentile(values, 0.9)),
+                                    '{:.3f}'.format(max(values))))
+    drops = [record['batteryBefore'] - record['batteryAfter'] for record in records
+             if record.get('batteryBefore', -1) >= 0 and record.get('batteryAfter', -1) >= 0]
+    if drops:
+        lines.append('battery drop per run: mean {:.2f}%, max {:.2f}% over {} runs'.format(
+            sum(drops) / len(drops), max(drops), len(drops)))
+    importTimes = {}
+    for record in records:
+        for package, seconds in record.get('importTimes', {}).items():
+            importTimes[package] = importTimes.get(package, 0.0) + seconds / len(records)
+    if importTimes:
+        lines.append('imports per run ' + import_summary(importTimes))
+    refreshed = [record for record in records if 'refreshed' in record]
+    if refreshed:
+        lines.append('display refreshed in {} of {} runs'.format(
+            sum(1 for record in refreshed if record['refreshed']), len(refreshed)))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'profile.jsonl'
+    records = load_records(path)
+    if not records:
+        print('No runs recorded in ' + path)
+    else:
+        print(report(records))
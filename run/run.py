@@ -1,10 +1,27 @@
 import datetime as dt
 
 from pytz import timezone
-from gcal.gcal import GcalHelper
-from render.render import RenderHelper
+from render.worker import RenderWorker
 from power.power import PowerHelper
+from run.prefetch import FrameCache, Prefetcher
+from run.scheduler import plan_next_refresh, after_quiet_hours
+from run.profiler import Profiler, compact_import_times, import_summary, take_import_times
+from importlib import import_module
+import pathlib
 import logging
+import threading
+
+# The Google API client, numpy, cv2, imgkit and Pillow are imported in the phase that needs them, not with this
+# module. The render modules are warmed up on a background thread while the calendars are fetched
+RENDER_MODULES = {'html': ('render.render', 'cv2', 'imgkit'), 'pil': ('render.pilrender',)}
+
+
+def preload_modules(names):
+    for name in names:
+        try:
+            import_module(name)
+        except ImportError:
+            pass  # reported by the render itself
 
 class RunHelper:
 
@@ -29,6 +46,53 @@ class RunHelper:
         self.rotateAngle = config['rotateAngle']
         self.isDisplayToScreen = config['isDisplayToScreen']
         self.isShutdownOnComplete = config['isShutdownOnComplete']
+        self.displayPipelined = config.get('displayPipelined', False)
+        self.renderBackend = config.get('renderBackend', 'html')
+        self.saveDebugImages = config.get('saveDebugImages', False)
+        # folder for calendar.html and the debug images, the render folder if None, see run/batch.py
+        self.renderWorkDir = config.get('renderWorkDir')
+        self.skipUnchangedRefresh = config.get('skipUnchangedRefresh', False)
+        self.renderWorker = None
+        self.renderPreload = None
+        self.updateLock = threading.Lock()
+        # "interval" refreshes on a fixed grid, "smart" plans the next refresh from the events, see run/scheduler.py
+        self.refreshMode = config.get('refreshMode', 'interval')
+        self.pollIntervalMinutes = config.get('pollIntervalMinutes', 180)
+        self.quietHours = config.get('quietHours')
+        self.nextRefresh = None  # (time, reason) planned by the last update
+        self.profileFile = config.get('profileFile')
+        if self.profileFile is not None:
+            self.profileFile = str(pathlib.Path(__file__).parent.parent.absolute() / self.profileFile)
+        self.fragmentCacheSize = config.get('fragmentCacheSize', 256)
+        # colour separation of the HTML screenshot, see render.channels
+        self.channelOptions = {key: config[key] for key in ('blackThreshold', 'blackDither', 'redLower', 'redUpper')
+                               if key in config}
+        self.maxParallelFetches = config.get('maxParallelFetches', 1)
+        # seconds an API connection or response may take before the fetch fails, None for the library defaults
+        self.fetchTimeout = config.get('fetchTimeout')
+        # keep the last good frame of every page on disk, show it while fresh data is fetched and keep it on screen
+        # when the calendar cannot be reached, see run/lastgood.py
+        self.staleWhileRevalidate = config.get('staleWhileRevalidate', False)
+        # one-shot wake cycles (PiSugar without buttons) shut down after the update and fetch before showing
+        self.revalidateInBackground = not self.piSugar2Present or config.get('buttonPresent', False)
+        self.lastGoodStore = None
+        self.updateCount = 0
+        # set by maginkcal.py when frames are served to thin display clients, see run/frameserver.py
+        self.frameServer = None
+        self.eventStore = None
+        if config.get('useEventStore', False):
+            from gcal.eventstore import EventStore
+            self.eventStore = EventStore(str(pathlib.Path(__file__).parent.parent.absolute()) + '/gcal/events.sqlite')
+        self.dataVersion = 0
+        self.lastBatteryLevel = 100
+        self.frameCache = FrameCache(config.get('frameCacheSize', 8))
+        self.prefetcher = None
+        if config.get('prefetchAdjacentPages', False):
+            self.prefetcher = Prefetcher(self)
+        self.timestampRegion = config.get('timestampRegion')
+        self.frameStore = None
+        # phase timings of the current update, appended as a JSON line to profileFile (relative to the project folder)
+        self.profiler = Profiler()
 
 
     def setCalStartEndTime(self,date, range, startToday, weekStartDay):
@@ -80,8 +144,257 @@ class RunHelper:
                 return
 
 
-    def maginkcal(self, date, view, startToday):
+    def get_render_worker(self):
+        # The render worker and its helper are kept across updates, so button presses only pay for the layout
+        if self.renderWorker is None:
+            if self.renderBackend == 'pil':
+                from render.pilrender import PilRenderHelper
+                renderService = PilRenderHelper(self.imageWidth, self.imageHeight, self.rotateAngle,
+                                                self.saveDebugImages, self.fragmentCacheSize, self.renderWorkDir)
+            else:
+                from render.render import RenderHelper
+                renderService = RenderHelper(self.imageWidth, self.imageHeight, self.rotateAngle, self.saveDebugImages,
+                                             self.fragmentCacheSize, self.renderWorkDir, **self.channelOptions)
+            self.renderWorker = RenderWorker(renderService)
+        return self.renderWorker
+
+    def preload_render_modules(self):
+        # Before the first render, import the render modules while the main thread waits for the calendar API. It
+        # starts once the session is set up, so it does not compete with the imports the first request needs. A
+        # render that starts before the import finished waits for it on the import lock of the module
+        if self.renderWorker is None and self.renderPreload is None:
+            self.renderPreload = threading.Thread(target=preload_modules, name='render-preload', daemon=True,
+                                                  args=(RENDER_MODULES.get(self.renderBackend, RENDER_MODULES['html']),))
+            self.renderPreload.start()
+
+    def get_frame_store(self):
+        if self.frameStore is None:
+            from display.framediff import FrameStore
+            self.frameStore = FrameStore(str(pathlib.Path(__file__).parent.parent.absolute()) +
+                                         '/display/lastframe.npz', self.timestampRegion)
+        return self.frameStore
+
+    def is_refresh_needed(self, blackBuf, redBuf, skipUnchanged=None):
+        # Compare the packed frame against the one on screen, skip the slow full refresh when nothing visible changed.
+        # An identical frame is always skipped, one with only a new timestamp if skipUnchanged (which overrides the
+        # skipUnchangedRefresh setting) is on
+        diff = self.get_frame_store().compare(blackBuf, redBuf)
+        stats = '{} of {} bytes differ (black {}, red {})'.format(
+            diff['blackBytes'] + diff['redBytes'], diff['totalBytes'], diff['blackBytes'], diff['redBytes'])
+        if diff['state'] == 'new':
+            self.logger.info('No previous frame stored, updating display')
+            return True
+        if diff['state'] == 'identical':
+            self.logger.info('Frame unchanged, {}, skipping display update'.format(stats))
+            return False
+        if diff['state'] == 'timestamp':
+            self.logger.info('Only timestamp changed in box {}, {}'.format(diff['bbox'], stats))
+        else:
+            self.logger.info('Frame changed in box {}, {}'.format(diff['bbox'], stats))
+            return True
+        if not (self.skipUnchangedRefresh if skipUnchanged is None else skipUnchanged):
+            return True
+        self.logger.info('Skipping display update')
+        return False
+
+    def get_cal_range(self, date, view, startToday):
+        if startToday == "default":
+            if view == "week" or "2week":
+                startToday = self.weekStartToday
+            elif view == "month":
+                startToday = self.monthStartToday
+        return self.setCalStartEndTime(date, view, startToday, self.weekStartDay)
+
+    def get_next_view(self, view):
+        # Views cycle from "week" to "2week" to "month" and back
+        if view == "week":
+            return "2week"
+        elif view == "2week":
+            return "month"
+        return "week"
+
+    def get_adjacent_date(self, date, view, direction):
+        # Date of the previous (direction -1) or next (direction 1) page of a view
+        if view == "week":
+            return date + direction * dt.timedelta(days=7)
+        # Assuming each month has 30 days for simplicity, you can modify this part as needed.
+        return date + direction * dt.timedelta(days=30)
+
+    def build_frame(self, date, view, calRange, currDatetime, currBatteryLevel, prefetch=False):
+        # Retrieve the events of one page, render and pack it. Prefetched pages are not counted as session updates
+        calStartDatetime = self.displayTZ.localize(dt.datetime.combine(calRange['StartDate'], dt.datetime.min.time()))
+        calEndDatetime = self.displayTZ.localize(dt.datetime.combine(calRange['EndDate'], dt.datetime.max.time()))
+
+        # Using Google Calendar to retrieve all events within start and end date (inclusive)
+        from gcal.gcal import GcalHelper
+        start = dt.datetime.now()
+        gcalService = GcalHelper(self.eventStore, self.maxParallelFetches, self.fetchTimeout, countUpdate=not prefetch)
+        self.preload_render_modules()
+        #gcalService.list_calendars()
+        eventList = gcalService.retrieve_events(self.calendars, calStartDatetime, calEndDatetime, self.displayTZ, self.thresholdHours)
+        #eventList = []
+        self.logger.info("Calendar events retrieved in " + str(dt.datetime.now() - start))
+
+        frame = self.render_page(date, view, calRange, currDatetime, currBatteryLevel, eventList)
+        frame['timings'] = dict(gcalService.timings, **frame['timings'])
+        frame['fetchStart'] = gcalService.fetchStart
+        # fresh events, show_frame keeps them as the last good page once the frame is shown
+        frame['events'] = eventList
+        frame['fetched'] = currDatetime
+        return frame
+
+    def render_page(self, date, view, calRange, currDatetime, currBatteryLevel, eventList, fetched=None):
+        # Render and pack a page, fetched is the time the events were retrieved if they are not fresh
+        shownTime = fetched if fetched is not None else currDatetime
+        # Populate dictionary with information to be rendered on e-ink display
+        calDict = {'events': eventList, 'calStartDate': calRange['StartDate'], 'today': currDatetime.date(), 'lastRefresh': currDatetime,
+                   'batteryLevel': currBatteryLevel, 'batteryDisplayMode': self.batteryDisplayMode,
+                   'dayOfWeekText': self.dayOfWeekText, 'weekStartDay': self.weekStartDay, 'maxEventsPerDay': self.maxEventsPerDay,
+                   'is24hour': self.is24hour, 'calRange': calRange['Range'], 'referenceDay': date, 'time': shownTime.strftime("%d.%m.%Y %H:%M:%S")}
+
+        # the render helpers hand back the packed planes in screen orientation
+        black, red = self.get_render_worker().render(calDict)
+        nextRefresh = plan_next_refresh(eventList, currDatetime, self.displayTZ, self.thresholdHours,
+                                        self.pollIntervalMinutes)
+        return {'view': view, 'calRange': calRange, 'black': black, 'red': red, 'fragmentStats': calDict['fragmentStats'],
+                'nextRefresh': nextRefresh, 'timings': calDict['timings'], 'fetchStart': None, 'events': None}
+
+    def get_last_good_store(self):
+        if self.lastGoodStore is None:
+            from run.lastgood import LastGoodStore
+            self.lastGoodStore = LastGoodStore(str(pathlib.Path(__file__).parent.parent.absolute()) +
+                                               '/display/lastgood.npz', self.displayTZ, self.frameCache.maxSize)
+        return self.lastGoodStore
+
+    def stale_frame(self, page, date, view, calRange, currDatetime, currBatteryLevel):
+        # The last good frame of a page. If it was rendered on an earlier day, its events are rendered again so the
+        # date circle and the highlights of updated events are current, the timestamp stays the time of the fetch
+        events = self.get_last_good_store().get_events(page, self.thresholdHours, currDatetime)
+        self.logger.info("Showing the {} page starting {} with the events fetched {}".format(
+            view, calRange['StartDate'], page['fetched']))
+        if page['today'] != currDatetime.date():
+            return self.render_page(date, view, calRange, currDatetime, currBatteryLevel, events, page['fetched'])
+        nextRefresh = plan_next_refresh(events, currDatetime, self.displayTZ, self.thresholdHours,
+                                        self.pollIntervalMinutes)
+        return {'view': view, 'calRange': calRange, 'black': page['black'], 'red': page['red'],
+                'fragmentStats': None, 'nextRefresh': nextRefresh, 'timings': {}, 'fetchStart': None, 'events': None}
+
+    def start_revalidation(self, date, view, calRange, currBatteryLevel):
+        threading.Thread(target=self.revalidate, name='revalidate', daemon=True,
+                         args=(date, view, calRange, currBatteryLevel, self.updateCount)).start()
+
+    def revalidate(self, date, view, calRange, currBatteryLevel, updateCount):
+        # Fetches fresh data for a page that is shown from the last good frame, on its own thread. The fetch does not
+        # hold the update lock, the display is only touched if no other update started in the meantime and is only
+        # repainted if the fresh frame differs from the one on screen
+        profiler = Profiler()
+        profiler.set('view', view)
+        profiler.set('revalidation', True)
+        try:
+            currDatetime = dt.datetime.now(self.displayTZ)
+            frame = self.build_frame(date, view, calRange, currDatetime, currBatteryLevel)
+            profiler.update(frame['timings'])
+            with self.updateLock:
+                if updateCount != self.updateCount:
+                    self.logger.info("Revalidated {} page is no longer shown".format(view))
+                    return
+                self.frameCache.put((view, calRange['StartDate'], self.dataVersion), frame)
+                self.nextRefresh = frame['nextRefresh']
+                self.show_frame(frame, currDatetime.date(), profiler, skipUnchanged=True)
+                self.logger.info("Revalidated {} page starting {}, display {}".format(
+                    view, calRange['StartDate'], 'repainted' if profiler.values['refreshed'] else 'unchanged'))
+                if self.prefetcher is not None:
+                    self.prefetcher.schedule(date, view, self.dataVersion)
+        except Exception as e:
+            self.logger.error("Revalidation failed, keeping the last good frame: {}".format(e))
+            profiler.set('error', str(e))
+        finally:
+            self.write_profile(profiler)
+
+    def show_frame(self, frame, currDate, profiler, skipUnchanged=None):
+        # Send a frame to the display unless the same frame is on screen already
+        profiler.set('refreshed', False)
+        if self.frameServer is not None:
+            self.frameServer.set_next_refresh(frame['nextRefresh'][0] if frame['nextRefresh'] else None)
+        elif not self.isDisplayToScreen:
+            return
+        if self.staleWhileRevalidate and frame['events'] is not None:
+            # only pages built from fresh events and actually shown are kept, not the prefetched or stale ones
+            self.get_last_good_store().put(frame['view'], frame['calRange'], frame['fetched'].date(), frame['events'],
+                                           frame['black'], frame['red'], frame['fetched'])
+        # the thin clients of the frame server get the same verdict, a skipped frame keeps its version
+        if not self.is_refresh_needed(frame['black'], frame['red'], skipUnchanged):
+            return
+        if self.frameServer is not None:
+            self.frameServer.publish(frame['black'], frame['red'])
+            if not self.isDisplayToScreen:
+                # the published frame is the one on the screens of the clients
+                self.get_frame_store().save(frame['black'], frame['red'])
+                profiler.set('refreshed', True)
+                return
+        with profiler.phase('display init'):
+            from display.display import DisplayHelper
+            displayService = DisplayHelper(self.screenWidth, self.screenHeight, self.displayPipelined)
+        if currDate.weekday() == self.weekStartDay:
+            # calibrate display once a week to prevent ghosting
+            displayService.calibrate(cycles=0)  # to calibrate in production
+        displayService.update_buffers(frame['black'], frame['red'])
+        profiler.update(displayService.get_timings())
+        with profiler.phase('display sleep'):
+            displayService.sleep()
+        self.get_frame_store().save(frame['black'], frame['red'])
+        profiler.set('refreshed', True)
+
+    def prefetch_page(self, date, view, dataVersion):
+        # Called on the prefetcher thread for each neighbouring page
+        calRange = self.get_cal_range(date, view, "default")
+        key = (view, calRange['StartDate'], dataVersion)
+        if dataVersion != self.dataVersion or key in self.frameCache:
+            return
+        currDatetime = dt.datetime.now(self.displayTZ)
+        self.frameCache.put(key, self.build_frame(date, view, calRange, currDatetime, self.lastBatteryLevel,
+                                                  prefetch=True))
+        self.logger.info("Prerendered {} page starting {}".format(view, calRange['StartDate']))
+
+    def maginkcal(self, date, view, startToday, cached=False):
+        # Single flight: scheduled refreshes and button presses share the display, a second update waits for the
+        # running one to finish instead of overlapping it
+        if not self.updateLock.acquire(blocking=False):
+            self.logger.info("Calendar update in progress, waiting for it to finish")
+            self.updateLock.acquire()
+        try:
+            self.update(date, view, startToday, cached)
+        finally:
+            self.updateLock.release()
+
+    def write_profile(self, profiler):
+        # one JSON line per update, aggregated with python -m run.profiler
+        # modules imported during the update, on top of the startup imports maginkcal.py set for the first one
+        importTimes = take_import_times()
+        if importTimes:
+            self.logger.info('Imports during the update took ' + import_summary(importTimes))
+        for package, seconds in profiler.values.get('importTimes', {}).items():
+            importTimes[package] = importTimes.get(package, 0.0) + seconds
+        if importTimes:
+            profiler.set('importTimes', compact_import_times(importTimes))
+        if self.profileFile is None:
+            return
+        try:
+            record = profiler.write(self.profileFile)
+            self.logger.info("Update took {:.3f}s: {}".format(record['total'], ', '.join(
+                '{} {:.3f}s'.format(name, seconds) for name, seconds in record['phases'].items())))
+        except OSError as e:
+            self.logger.error('Profile not written: {}'.format(e))
+
+    def update(self, date, view, startToday, cached=False):
         self.logger.info("Starting calendar update")
+        self.updateCount += 1
+        # the profiler of the first update was created with the helper and includes the startup
+        if self.profiler is None:
+            self.profiler = Profiler()
+        profiler = self.profiler
+        profiler.set('view', view)
+        wakeUpSet = False  # the PiSugar RTC alarm was set by this update
 
         try:
             # Establish current date and time information
@@ -90,66 +403,106 @@ class RunHelper:
             # The calendar will also display 5 weeks of events to cover the upcoming month, ending on a Saturday
             if self.piSugar2Present:
                 powerService = PowerHelper()
-                powerService.sync_time()
+                with profiler.phase('sync time'):
+                    powerService.sync_time()
                 currBatteryLevel = powerService.get_battery()
+                profiler.set('batteryBefore', currBatteryLevel)
                 self.logger.info('Battery level at start: {:.3f}'.format(currBatteryLevel))
             else:
                 self.logger.info('no piSugar2 present set Dummy values')
                 currBatteryLevel = 100
 
-            if startToday == "default":
-                if view == "week" or "2week":
-                    startToday = self.weekStartToday
-                elif view == "month":
-                    startToday = self.monthStartToday
-                    
             currDatetime = dt.datetime.now(self.displayTZ)
             self.logger.info("Time synchronised to {}".format(currDatetime))
             currDate = currDatetime.date()
-            calRange = self.setCalStartEndTime(date, view, startToday, self.weekStartDay)
-            calStartDatetime = self.displayTZ.localize(dt.datetime.combine(calRange['StartDate'], dt.datetime.min.time()))
-            calEndDatetime = self.displayTZ.localize(dt.datetime.combine(calRange['EndDate'], dt.datetime.max.time()))
-
-            # Using Google Calendar to retrieve all events within start and end date (inclusive)
-            start = dt.datetime.now()
-            gcalService = GcalHelper()
-            #gcalService.list_calendars()
-            eventList = gcalService.retrieve_events(self.calendars, calStartDatetime, calEndDatetime, self.displayTZ, self.thresholdHours)
-            #eventList = []
-            self.logger.info("Calendar events retrieved in " + str(dt.datetime.now() - start))
-
-            # Populate dictionary with information to be rendered on e-ink display
-            calDict = {'events': eventList, 'calStartDate': calRange['StartDate'], 'today': currDate, 'lastRefresh': currDatetime,
-                    'batteryLevel': currBatteryLevel, 'batteryDisplayMode': self.batteryDisplayMode,
-                    'dayOfWeekText': self.dayOfWeekText, 'weekStartDay': self.weekStartDay, 'maxEventsPerDay': self.maxEventsPerDay,
-                    'is24hour': self.is24hour, 'calRange': calRange['Range'], 'referenceDay': date, 'time': currDatetime.strftime("%d.%m.%Y %H:%M:%S")}
-
-            renderService = RenderHelper(self.imageWidth, self.imageHeight, self.rotateAngle)
-            calBlackImage, calRedImage = renderService.process_inputs(calDict)
-
-            if self.isDisplayToScreen:
-                from display.display import DisplayHelper
-                displayService = DisplayHelper(self.screenWidth, self.screenHeight)
-                if currDate.weekday() == self.weekStartDay:
-                    # calibrate display once a week to prevent ghosting
-                    displayService.calibrate(cycles=0)  # to calibrate in production
-                displayService.update(calBlackImage, calRedImage)
-                displayService.sleep()
+            calRange = self.get_cal_range(date, view, startToday)
+
+            # Pages requested from the previous/next/view buttons may already have been prerendered, everything
+            # else means fresh data: bump the data version, which invalidates all prerendered pages
+            frame = None
+            if cached:
+                frame = self.frameCache.get((view, calRange['StartDate'], self.dataVersion))
+            else:
+                self.dataVersion += 1
+                self.frameCache.clear()
+            profiler.set('cached', frame is not None)
+            revalidating = False
+            stale = False
+            if frame is None:
+                page = None
+                if self.staleWhileRevalidate:
+                    page = self.get_last_good_store().get(view, calRange['StartDate'])
+                if page is not None and self.revalidateInBackground:
+                    # stale while revalidate: the last good frame right away, fresh data once the fetch succeeds
+                    frame = self.stale_frame(page, date, view, calRange, currDatetime, currBatteryLevel)
+                    stale = revalidating = True
+                else:
+                    try:
+                        frame = self.build_frame(date, view, calRange, currDatetime, currBatteryLevel)
+                    except Exception as e:
+                        if page is None:
+                            raise
+                        self.logger.error("Calendar not reachable, keeping the last good frame: {}".format(e))
+                        profiler.set('error', str(e))
+                        frame = self.stale_frame(page, date, view, calRange, currDatetime, currBatteryLevel)
+                        stale = True
+                    else:
+                        self.frameCache.put((view, calRange['StartDate'], self.dataVersion), frame)
+                        profiler.mark('firstFetch', frame['fetchStart'])
+                profiler.update(frame['timings'])
+            self.lastBatteryLevel = currBatteryLevel
+            self.logger.info("Frame cache: {} hits, {} misses".format(self.frameCache.hits, self.frameCache.misses))
+            fragmentStats = frame['fragmentStats']
+            if fragmentStats is not None:
+                dayCount = fragmentStats['hits'] + fragmentStats['misses']
+                self.logger.info("Day fragments: {} of {} reused ({:.0%} hit rate), {} regenerated in {:.3f}s".format(
+                    fragmentStats['hits'], dayCount, fragmentStats['hits'] / max(dayCount, 1),
+                    fragmentStats['misses'], fragmentStats['regenerationTime']))
+
+            profiler.set('stale', stale)
+            # a stale frame is never painted again if it is on screen already
+            self.show_frame(frame, currDate, profiler, True if stale else None)
+
+            self.nextRefresh = frame['nextRefresh']
+            if self.refreshMode == 'smart':
+                self.logger.info("Next refresh planned for {} ({})".format(*self.nextRefresh))
+                if self.piSugar2Present:
+                    # the RTC alarm wakes the Pi up again, quiet hours are respected here as well
+                    wallTime = self.nextRefresh[0].replace(tzinfo=None)
+                    bootTime = self.displayTZ.localize(after_quiet_hours(wallTime, self.quietHours))
+                    wakeUpSet = powerService.set_next_boot_datetime(bootTime)
+                    if wakeUpSet:
+                        self.logger.info("PiSugar wake up set to {}".format(bootTime))
+
+            if revalidating:
+                self.start_revalidation(date, view, calRange, currBatteryLevel)
+            elif self.prefetcher is not None:
+                self.prefetcher.schedule(date, view, self.dataVersion)
             if self.piSugar2Present:
                 currBatteryLevel = powerService.get_battery()
+                profiler.set('batteryAfter', currBatteryLevel)
                 self.logger.info('Battery level at end: {:.3f}'.format(currBatteryLevel))
 
         except Exception as e:
             self.logger.error(e)
+            profiler.set('error', str(e))
 
+        self.profiler = None
+        self.write_profile(profiler)
         self.logger.info("Completed calendar update")
 
         self.logger.info("Checking if configured to shutdown safely - Current hour: {}".format(currDatetime.hour))
-        if self.isShutdownOnComplete:
-            # implementing a failsafe so that we don't shutdown when debugging
-            # checking if it's 6am in the morning, which is the time I've set PiSugar to wake and refresh the calendar
-            # if it is 6am, shutdown the RPi. if not 6am, assume I'm debugging the code, so do not shutdown
-            if currDatetime.hour == 6:
-                self.logger.info("Shutting down safely.")
-                import os
-                os.system("sudo shutdown -h now")
\ No newline at end of file
+        if self.isShutdownOnComplete and self.is_shutdown_due(currDatetime, wakeUpSet):
+            self.logger.info("Shutting down safely.")
+            import os
+            os.system("sudo shutdown -h now")
+
+    def is_shutdown_due(self, currDatetime, wakeUpSet):
+        # In the smart mode the scheduler picks the wake up time, the Pi powers off whatever the hour once the
+        # PiSugar alarm for it is set. Without the alarm nothing would wake it up again
+        if self.piSugar2Present and wakeUpSet:
+            return True
+        # implementing a failsafe so that we don't shutdown when debugging
+        # checking if it's 6am in the morning, which is the time I've set PiSugar to wake and refresh the calendar
+        # if it is 6am, shutdown the RPi. if not 6am, assume I'm debugging the code, so do not shutdown
+        return currDatetime.hour == 6
\ No newline at end of file
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Refresh scheduler for setups without PiSugar, where the Pi stays on and refreshes the calendar itself. Instead of
+polling the time it sleeps until the next refresh is due. Refreshes are aligned to the configured interval counted
+from midnight (60 minutes gives the previous behaviour of refreshing at the full hour) and skipped during quiet hours.
+In the "smart" refresh mode the next refresh is planned from the events on the page instead, see plan_next_refresh.
+The clock is injectable, run/fakeclock.py provides one that advances instantly.
+"""
+
+import datetime as dt
+import logging
+import threading
+
+# the sleep is split into chunks of at most this many seconds, so a corrected system time (e.g. after an NTP or RTC
+# sync) delays a refresh by no more than that
+MAX_SLEEP = 300
+
+
+class Clock:
+
+    def __init__(self, tz):
+        self.tz = tz
+
+    def now(self):
+        return dt.datetime.now(self.tz)
+
+    def wait(self, seconds, stopEvent):
+        # returns True if stopEvent was set while waiting
+        return stopEvent.wait(seconds)
+
+
+def is_quiet(time, quietHours):
+    # quietHours is [start hour, end hour], e.g. [23, 6] for no refreshes from 23:00 until 06:00
+    if not quietHours:
+        return False
+    start, end = quietHours
+    if start <= end:
+        return start <= time.hour < end
+    return time.hour >= start or time.hour < end
+
+
+def after_quiet_hours(deadline, quietHours):
+    # a refresh due in the quiet hours is moved to their end, deadline is a naive local datetime
+    if not is_quiet(deadline, quietHours):
+        return deadline
+    quietEnd = dt.datetime.combine(deadline.date(), dt.time(quietHours[1]))
+    return quietEnd if quietEnd > deadline else quietEnd + dt.timedelta(days=1)
+
+
+def plan_next_refresh(events, now, tz, thresholdHours, pollMinutes):
+    # Earliest time at which a refresh can change the image, computed from the events on the page, and the reason.
+    # The date circle moves at midnight, the red highlight of an updated event ends thresholdHours after the update
+    # and new or changed events can only be found by asking the calendar again
+    # normalize moves the sum to the UTC offset in effect then, it may have changed in between (DST)
+    plan = (tz.normalize(now + dt.timedelta(minutes=pollMinutes)), 'polling for new events')
+    midnight = tz.localize(dt.datetime.combine(now.date() + dt.timedelta(days=1), dt.time()))
+    if midnight < plan[0]:
+        plan = (midnight, 'day rollover')
+    nowTimestamp = now.timestamp()
+    for event in events:
+        if event.isUpdated:
+            expiry = event.updated + thresholdHours * 3600
+            if nowTimestamp < expiry < plan[0].timestamp():
+                # one second late, so the refresh does not see the event as recently updated anymore
+                plan = (dt.datetime.fromtimestamp(expiry + 1, tz), 'highlight of "{}" expires'.format(event.summary))
+    return plan
+
+
+class Scheduler:
+
+    def __init__(self, clock, intervalMinutes=60, quietHours=None, planner=None):
+        self.logger = logging.getLogger('maginkcal')
+        self.clock = clock
+        self.interval = dt.timedelta(minutes=intervalMinutes)
+        self.quietHours = quietHours
+        if all(is_quiet(dt.time(hour), quietHours) for hour in range(24)):
+            raise ValueError('quietHours {} leave no time for refreshes'.format(quietHours))
+        # optional callable returning (time, reason) of the next refresh planned from the event data, see
+        # plan_next_refresh. Without a plan the interval grid is used
+        self.planner = planner
+        self.stopEvent = threading.Event()
+
+    def next_run(self, after):
+        # Returns the next refresh time after the given time and the reason for it. The interval grid is laid out in
+        # local wall time and restarts every midnight, so refreshes stay on the full hour across DST changes
+        wallTime = after.astimezone(self.clock.tz).replace(tzinfo=None)
+        plan = self.planner() if self.planner is not None else None
+        if plan is not None and plan[0] > after:
+            deadline, reason = plan[0].astimezone(self.clock.tz).replace(tzinfo=None), plan[1]
+        else:
+            midnight = dt.datetime.combine(wallTime.date(), dt.time())
+            deadline = midnight + ((wallTime - midnight) // self.interval + 1) * self.interval
+            deadline = min(deadline, midnight + dt.timedelta(days=1))
+            reason = 'every {} minutes'.format(int(self.interval.total_seconds() // 60))
+        if is_quiet(deadline, self.quietHours):
+            reason = 'end of quiet hours'
+            deadline = after_quiet_hours(deadline, self.quietHours)
+        return self.clock.tz.localize(deadline), reason
+
+    def sleep_until(self, deadline):
+        # returns False if the scheduler was stopped before the deadline
+        while True:
+            remaining = (deadline - self.clock.now()).total_seconds()
+            if remaining <= 0:
+                return True
+            if self.clock.wait(min(remaining, MAX_SLEEP), self.stopEvent):
+                return False
+
+    def run_forever(self, job):
+        # job gets the current time, a failing job is logged and the schedule continues
+        while not self.stopEvent.is_set():
+            deadline, reason = self.next_run(self.clock.now())
+            self.logger.info('Next refresh at {} ({})'.format(deadline, reason))
+            if not self.sleep_until(deadline):
+                break
+            try:
+                job(self.clock.now())
+            except Exception as e:
+                self.logger.error(e)
+
+    def stop(self):
+        self.stopEvent.set()
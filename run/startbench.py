@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark for one-shot wake cycles. Every run starts a fresh interpreter that goes through the start of
+maginkcal.py (imports, config, RunHelper) and the calendar fetch of the first update, and reports the time from
+spawning the process to the first calendar request and until the render helper is ready. "eager" imports everything
+at module load like maginkcal.py and run/run.py did before, "lazy" is the current loading. The calendar is served
+by gcal.fakeservice, so no credentials or network are needed and the OAuth setup itself is not part of the numbers.
+Run it from the repository root with: python -m run.startbench [runs] [html|pil]
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# what maginkcal.py and run/run.py imported at module load before the imports were moved into the phases
+EAGER_MODULES = ('gcal.gcal', 'render.render', 'cv2', 'imgkit', 'numpy', 'PIL.Image', 'google_auth_oauthlib.flow',
+                 'display.framediff')
+
+
+class FakeSession:
+    # stands in for gcal.session.GcalSession, the calendar comes from FakeCalendarService
+
+    def __init__(self, calendars):
+        import datetime as dt
+        from gcal.fakeservice import FakeCalendarService
+        self.service = FakeCalendarService()
+        self.creds = None
+        start = dt.datetime.now(dt.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        for cal in calendars:
+            for i in range(40):
+                eventStart = start + dt.timedelta(hours=7 * i)
+                self.service.put_event(cal['id'], str(i), 'Event {}'.format(i), eventStart,
+                                       eventStart + dt.timedelta(hours=1))
+
+    def begin_update(self):
+        pass
+
+    def get_http(self):
+        return None
+
+
+def child(mode, backend):
+    # one wake cycle up to the first fetch, prints the results as JSON
+    from run.profiler import install_import_timer, take_import_times
+    install_import_timer()
+    if mode == 'eager':
+        from importlib import import_module
+        for name in EAGER_MODULES:
+            try:
+                import_module(name)
+            except ImportError:
+                pass
+    import datetime as dt
+    from run.run import RunHelper
+    with open('config.json') as file:
+        config = json.load(file)
+    config.update({'renderBackend': backend, 'piSugar2Present': False, 'isDisplayToScreen': False,
+                   'useEventStore': False, 'prefetchAdjacentPages': False, 'profileFile': None})
+    run = RunHelper(config)
+
+    # the fetch of build_frame
+    import gcal.session
+    from gcal.gcal import GcalHelper
+    gcal.session._session = FakeSession(config['calendars'])
+    calRange = run.get_cal_range(dt.date.today(), config['defaultView'], 'default')
+    startDatetime = run.displayTZ.localize(dt.datetime.combine(calRange['StartDate'], dt.time()))
+    endDatetime = run.displayTZ.localize(dt.datetime.combine(calRange['EndDate'], dt.time.max))
+    gcalService = GcalHelper()
+    run.preload_render_modules()
+    gcalService.retrieve_events(config['calendars'], startDatetime, endDatetime, run.displayTZ, run.thresholdHours)
+    # wall clock time of the first request, comparable with the time the parent spawned the process at
+    fetchWall = time.time() - (time.perf_counter() - gcalService.fetchStart)
+
+    # the render helper of the first render, waits for the preload
+    run.get_render_worker()
+    readyWall = time.time()
+    print(json.dumps({'fetch': fetchWall, 'ready': readyWall, 'imports': take_import_times()}))
+
+
+def spawn(mode, backend):
+    start = time.time()
+    output = subprocess.run([sys.executable, '-m', 'run.startbench', '--child', mode, backend], check=True,
+                            capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result['fetch'] - start, result['ready'] - start, result['imports']
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    from run.profiler import import_summary
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'html'
+    print('{} runs per mode, {} rendering'.format(runs, backend))
+    for mode in ('eager', 'lazy'):
+        results = [spawn(mode, backend) for _ in range(runs)]
+        print('{:6s} first fetch after {:.3f}s, render ready after {:.3f}s (medians)'.format(
+            mode, statistics.median(result[0] for result in results),
+            statistics.median(result[1] for result in results)))
+        print('       imports of the last run ' + import_summary(results[-1][2]))